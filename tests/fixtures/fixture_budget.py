@@ -0,0 +1,73 @@
+"""Данные для проверки бюджетов запросов: страницы лент и веток полнее,
+чем POST_NUMBER и COMMENT_NUMBER, и несколько авторов комментариев, чтобы
+лишний запрос на пост или комментарий вышел за бюджет. У постов есть
+картинки: миниатюры sorl-thumbnail тоже ходят в базу."""
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from posts.models import Comment, Follow, Group, Post
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def image(name):
+    return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+
+@pytest.fixture
+def budget_data(django_user_model, user, group, mock_media):
+    user.is_staff = True
+    user.save()
+    author = django_user_model.objects.create_user(username='BudgetAuthor')
+    other = django_user_model.objects.create_user(username='BudgetOther')
+    commenters = [
+        django_user_model.objects.create_user(username=f'BudgetReader{i}')
+        for i in range(5)
+    ]
+    Follow.objects.create(user=user, author=author)
+    Follow.objects.create(user=commenters[0], author=user)
+    other_group = Group.objects.create(
+        title='Тестовая группа 2', slug='budget-link', description='-'
+    )
+    posts = [
+        Post.objects.create(
+            text=f'Пост {i}',
+            author=author,
+            group=group if i % 2 else other_group,
+            image=image(f'budget{i}.gif'),
+        )
+        for i in range(25)
+    ]
+    own = Post.objects.create(
+        text='Свой пост', author=user, group=group, image=image('own.gif')
+    )
+    post = posts[-1]
+    roots = []
+    for i in range(25):
+        root = Comment.objects.create(
+            post=post, author=commenters[i % 5], text=f'Корень {i}'
+        )
+        roots.append(root)
+        for j in range(3):
+            Comment.objects.create(
+                post=post,
+                author=commenters[j],
+                text=f'Ответ {j}',
+                parent=root if j < 2 else roots[-1].children.first(),
+            )
+    return {
+        'user': user,
+        'author': author,
+        'other': other,
+        'group': group,
+        'post': post,
+        'own': own,
+        'root': roots[0],
+        'reply': roots[0].children.first(),
+    }
@@ -0,0 +1,35 @@
+import pytest
+from core.metrics import fingerprint
+
+pytestmark = [pytest.mark.django_db]
+
+
+class TestMetrics:
+
+    def test_fingerprint_drops_literals(self):
+        assert fingerprint(
+            'SELECT "id" FROM "posts_post" WHERE "id" IN (%s, %s, 3) '
+            "AND text = 'it''s'\n LIMIT 21"
+        ) == 'SELECT "id" FROM "posts_post" WHERE "id" IN (...) AND text = ? LIMIT ?'
+
+    def test_metrics_endpoint(self, client, post):
+        client.get('/')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        text = response.content.decode()
+        for metric in (
+            'yatube_request_queries',
+            'yatube_request_db_seconds',
+            'yatube_request_template_seconds',
+            'yatube_request_response_bytes',
+            'yatube_request_seconds',
+        ):
+            assert f'{metric}_count{{view="posts:index"}}' in text, (
+                f'Метрика `{metric}` должна учитывать запросы к `/`'
+            )
+        assert 'yatube_request_slowest_query_seconds{view="posts:index",fingerprint="SELECT' in text
+
+    def test_metrics_need_allowed_address(self, client, settings):
+        settings.METRICS_IPS = []
+        assert client.get('/metrics').status_code == 403
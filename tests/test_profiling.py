@@ -0,0 +1,47 @@
+import os
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def profile_dir(settings, tmp_path):
+    cache.clear()
+    settings.PROFILE_DIR = str(tmp_path)
+    return tmp_path
+
+
+class TestProfiling:
+
+    def test_sampled_view_is_dumped(self, client, settings, profile_dir, post):
+        settings.PROFILE_VIEWS = ['posts:index']
+        client.get('/')
+        client.get('/about/author/')
+        names = sorted(os.listdir(profile_dir))
+        assert [os.path.splitext(name)[1] for name in names] == ['.collapsed', '.prof']
+        assert all(name.endswith('-posts.index' + os.path.splitext(name)[1]) for name in names)
+        collapsed = (profile_dir / names[0]).read_text()
+        assert ';index (views.py:' in collapsed, (
+            'Свёрнутые стеки должны проходить через представление'
+        )
+
+        out = StringIO()
+        call_command('merge_profiles', dir=str(profile_dir), stdout=out)
+        assert 'posts:index\t1\t' in out.getvalue()
+        merged = os.listdir(profile_dir / 'merged')
+        assert sorted(merged) == ['posts.index.collapsed', 'posts.index.prof']
+
+    def test_header_and_rotation(self, client, settings, profile_dir):
+        settings.PROFILE_HEADER = 'HTTP_X_PROFILE'
+        settings.PROFILE_KEEP = 1
+        client.get('/')
+        assert os.listdir(profile_dir) == []
+        client.get('/', HTTP_X_PROFILE='1')
+        client.get('/about/author/', HTTP_X_PROFILE='1')
+        names = os.listdir(profile_dir)
+        assert len(names) == 2
+        assert all('about.author' in name for name in names)
@@ -0,0 +1,81 @@
+import pytest
+from core.query_budget import budget_of
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+from django.utils.http import urlencode
+from posts.urls import app_name, urlpatterns
+
+pytestmark = [pytest.mark.django_db]
+THUMBNAIL_PAGES = {
+    'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+}
+
+
+def budget_cases(data):
+    """(имя url, аргументы, данные POST[, параметры GET]) для каждого
+    представления posts; посты лент и страницы поста - с картинками."""
+    post, own, root = data['post'].id, data['own'].id, data['root'].id
+    reply = data['reply'].id
+    group = data['group']
+    return [
+        ('index', {}, None),
+        ('group_posts', {'slug': group.slug}, None),
+        ('profile', {'username': data['author'].username}, None),
+        ('post_detail', {'post_id': post}, None),
+        ('comment_roots', {'post_id': post}, None),
+        # переход к комментарию: к корню и к ответу в ветке
+        ('comment_roots', {'post_id': post}, None, {'comment': root}),
+        ('comment_roots', {'post_id': post}, None, {'comment': reply}),
+        ('comment_children', {'post_id': post, 'comment_id': root}, None),
+        ('comment_thread', {'post_id': post, 'comment_id': root}, None),
+        ('comment_export', {'post_id': post}, None),
+        ('comment_cache', {}, None),
+        ('follow_index', {}, None),
+        ('post_create', {}, None),
+        ('post_create', {}, {'text': 'Новый пост', 'group': group.id}),
+        ('post_edit', {'post_id': own}, None),
+        ('post_edit', {'post_id': own}, {'text': 'Правка', 'group': group.id}),
+        ('add_comment', {'post_id': post}, {'text': 'Комментарий'}),
+        ('add_comment_child', {'post_id': post, 'id': root}, {'text': 'Ответ'}),
+        ('profile_follow', {'username': data['other'].username}, None),
+        ('profile_unfollow', {'username': data['other'].username}, None),
+    ]
+
+
+class TestQueryBudget:
+
+    def test_every_view_has_budget(self):
+        for pattern in urlpatterns:
+            assert budget_of(pattern.callback) is not None, (
+                f'Объявите бюджет запросов `@query_budget` для представления '
+                f'`{pattern.name}`'
+            )
+
+    def test_views_fit_budget(self, settings, budget_data):
+        anonymous = Client()
+        logged_in = Client()
+        logged_in.force_login(budget_data['user'])
+        cases = budget_cases(budget_data)
+        assert {name for name, *_ in cases} == {
+            pattern.name for pattern in urlpatterns
+        }, 'Добавьте в budget_cases каждое представление posts.urls'
+        # миниатюры создаются один раз при первом показе, вне бюджета
+        for name, kwargs, _, *_ in cases:
+            if name in THUMBNAIL_PAGES:
+                logged_in.get(reverse(f'{app_name}:{name}', kwargs=kwargs))
+        settings.QUERY_BUDGET_RAISE = True
+        for name, kwargs, data, *query in cases:
+            url = reverse(f'{app_name}:{name}', kwargs=kwargs)
+            if query:
+                url += '?' + urlencode(query[0])
+            for client in (anonymous, logged_in):
+                # холодный кэш: бюджет считается по худшему случаю
+                cache.clear()
+                if data is None:
+                    response = client.get(url)
+                else:
+                    response = client.post(url, data)
+                assert response.status_code < 500, (
+                    f'Страница `{url}` вернула {response.status_code}'
+                )
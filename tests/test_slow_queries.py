@@ -0,0 +1,89 @@
+import os
+from io import StringIO
+
+import pytest
+from core import slow_queries
+from core.slow_queries import read_log
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.signals import template_rendered
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def slow_log(settings, tmp_path):
+    cache.clear()
+    slow_queries.explained.clear()
+    settings.SLOW_QUERY_MS = 0
+    settings.SLOW_QUERY_LOG = str(tmp_path / 'slow.jsonl')
+    return settings.SLOW_QUERY_LOG
+
+
+class TestSlowQueries:
+
+    def test_queries_are_logged_with_context(self, client, slow_log, post):
+        client.get('/')
+        entries = [
+            entry for entry in read_log(slow_log)
+            if entry['view'] == 'posts:index'
+        ]
+        assert entries, 'Запросы страницы должны попасть в журнал с её именем'
+        assert any(
+            (entry['frame'] or '').startswith('posts' + os.sep)
+            for entry in entries
+        ), 'Запись должна указывать на место в коде posts'
+        assert any(entry.get('plan') for entry in entries), (
+            'Для нового отпечатка в журнал пишется план SQLite'
+        )
+        fingerprints = [entry['fingerprint'] for entry in entries if 'plan' in entry]
+        assert len(fingerprints) == len(set(fingerprints)), (
+            'План пишется один раз на отпечаток'
+        )
+
+    def test_threshold(self, client, settings, slow_log, post):
+        settings.SLOW_QUERY_MS = None
+        # запросы фикстуры post уже попали в журнал
+        if os.path.exists(slow_log):
+            os.remove(slow_log)
+        client.get('/')
+        assert not os.path.exists(slow_log)
+
+    def test_report(self, client, slow_log, post):
+        client.get('/')
+        out = StringIO()
+        call_command('slow_queries', log=slow_log, top=3, reset=True, stdout=out)
+        report = out.getvalue()
+        assert report.count(' ms\t') == 3
+        assert 'view posts:index' in report
+        assert not os.path.exists(slow_log)
+
+    def test_wrappers_do_not_leak(self, client, post):
+        def reconnect(**kwargs):
+            # соединение, открытое посреди запроса, как при CONN_MAX_AGE=0
+            connection_created.send(
+                sender=type(connection), connection=connection
+            )
+
+        saved = connection.execute_wrappers[:]
+        connection.execute_wrappers[:] = [
+            wrapper for wrapper in saved if wrapper is not slow_queries.recorder
+        ]
+        template_rendered.connect(reconnect)
+        try:
+            client.get('/')
+            wrappers = list(connection.execute_wrappers)
+            for _ in range(3):
+                # без кэша страницы шаблон рендерится заново
+                cache.clear()
+                client.get('/')
+        finally:
+            template_rendered.disconnect(reconnect)
+            current = connection.execute_wrappers[:]
+            connection.execute_wrappers[:] = saved
+        assert current == wrappers, (
+            'Обёртки запросов не должны копиться от запроса к запросу'
+        )
+        assert slow_queries.recorder in wrappers
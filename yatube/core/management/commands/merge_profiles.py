@@ -0,0 +1,51 @@
+import os
+import pstats
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.profiling import read_collapsed, write_collapsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Сводит профили ProfilingMiddleware по представлениям: один "
+        ".prof и один .collapsed на представление"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=settings.PROFILE_DIR)
+        parser.add_argument(
+            "--out", help="куда писать сводки (по умолчанию DIR/merged)"
+        )
+        parser.add_argument(
+            "--views", nargs="+", help="только эти имена URL"
+        )
+
+    def handle(self, *args, **options):
+        directory = options["dir"]
+        out = options["out"] or os.path.join(directory, "merged")
+        dumps = defaultdict(list)
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith(".prof"):
+                # <время>-<pid>-<имя URL с точками вместо двоеточий>
+                view = entry.name[: -len(".prof")].split("-", 2)[2]
+                dumps[view.replace(".", ":")].append(entry.path)
+        os.makedirs(out, exist_ok=True)
+        self.stdout.write("view\trequests\tmean_ms")
+        for view, paths in sorted(dumps.items()):
+            if options["views"] and view not in options["views"]:
+                continue
+            stats = pstats.Stats(*paths)
+            base = os.path.join(out, view.replace(":", "."))
+            stats.dump_stats(base + ".prof")
+            stacks = Counter()
+            for path in paths:
+                collapsed = path[: -len(".prof")] + ".collapsed"
+                if os.path.exists(collapsed):
+                    stacks.update(read_collapsed(collapsed))
+            write_collapsed(stacks, base + ".collapsed")
+            self.stdout.write(
+                f"{view}\t{len(paths)}\t"
+                f"{stats.total_tt * 1000 / len(paths):.1f}"
+            )
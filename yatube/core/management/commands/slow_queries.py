@@ -0,0 +1,65 @@
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.slow_queries import read_log
+
+
+class Command(BaseCommand):
+    help = (
+        "Сводит журнал медленных запросов по отпечаткам: число, суммарное "
+        "и наибольшее время, представления, места в коде и план"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=settings.SLOW_QUERY_LOG)
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument(
+            "--reset", action="store_true", help="очистить журнал после вывода"
+        )
+
+    def handle(self, *args, **options):
+        filename = options["log"]
+        if not os.path.exists(filename):
+            self.stdout.write(f"Журнал {filename} пуст")
+            return
+        groups = {}
+        for entry in read_log(filename):
+            group = groups.setdefault(
+                entry["fingerprint"],
+                {
+                    "count": 0,
+                    "total": 0,
+                    "max": 0,
+                    "views": Counter(),
+                    "frames": Counter(),
+                    "plan": None,
+                },
+            )
+            group["count"] += 1
+            group["total"] += entry["ms"]
+            group["max"] = max(group["max"], entry["ms"])
+            group["views"][entry["view"]] += 1
+            if entry["frame"]:
+                group["frames"][entry["frame"]] += 1
+            if group["plan"] is None and entry.get("plan"):
+                group["plan"] = entry["plan"]
+        ranked = sorted(
+            groups.items(), key=lambda item: item[1]["total"], reverse=True
+        )
+        for fingerprint, group in ranked[: options["top"]]:
+            self.stdout.write(
+                f"{group['total']:.1f} ms\t{group['count']}x\t"
+                f"max {group['max']:.1f} ms"
+            )
+            self.stdout.write(f"  {fingerprint}")
+            for view, count in group["views"].most_common(3):
+                self.stdout.write(f"  view {view}\t{count}")
+            for frame, count in group["frames"].most_common(3):
+                self.stdout.write(f"  at {frame}\t{count}")
+            for step in group["plan"] or ():
+                self.stdout.write(f"  plan {step}")
+            self.stdout.write("")
+        if options["reset"]:
+            os.remove(filename)
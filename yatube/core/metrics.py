@@ -0,0 +1,197 @@
+"""Метрики запросов в формате Prometheus.
+
+RequestMetricsMiddleware считает для каждого запроса число SQL-запросов
+и их время (connection.execute_wrapper), время рендера шаблонов, размер
+ответа и общее время. Значения складываются в гистограммы этого процесса
+с меткой view - именем разрешённого URL. Для каждого view запоминается
+самый медленный запрос в виде отпечатка: SQL без литералов. Гистограммы
+отдаёт core.views.metrics в текстовом формате Prometheus; у каждого
+процесса сервера они свои.
+
+На запрос приходится несколько вызовов perf_counter и одна блокировка
+при записи, поэтому сбор можно не выключать.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connection
+from django.template.base import Template
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+METRICS = {
+    "queries": ("Число SQL-запросов на запрос", QUERY_BUCKETS),
+    "db_seconds": ("Время SQL-запросов на запрос", SECONDS_BUCKETS),
+    "template_seconds": ("Время рендера шаблонов", SECONDS_BUCKETS),
+    "response_bytes": ("Размер ответа", BYTES_BUCKETS),
+    "seconds": ("Время обработки запроса", SECONDS_BUCKETS),
+}
+PREFIX = "yatube_request_"
+
+# литералы, которые отличают один запрос от другого того же вида
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER = r"\s*(?:%s|\?)\s*"
+IN_LISTS = re.compile(rf"\((?:{PLACEHOLDER},)+{PLACEHOLDER}\)")
+
+lock = threading.Lock()
+histograms = {}
+slowest = {}
+# счётчики и сам обрабатываемый запрос потока (для core.slow_queries)
+current = threading.local()
+
+
+def fingerprint(sql):
+    """SQL без литералов: запросы одного вида дают один отпечаток."""
+    sql = LITERALS.sub("?", sql)
+    return IN_LISTS.sub("(...)", " ".join(sql.split()))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    """Счётчики одного запроса; сам объект - обёртка execute_wrapper."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0
+        self.template_seconds = 0
+        self.template_depth = 0
+        self.slowest_seconds = 0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if elapsed > self.slowest_seconds:
+                self.slowest_seconds, self.slowest_sql = elapsed, sql
+
+
+def instrument_templates():
+    """Считает время внешних рендеров шаблонов (вложенные - их часть)."""
+    if getattr(Template._render, "metrics", False):
+        return
+    render = Template._render
+
+    def timed_render(self, context):
+        stats = getattr(current, "stats", None)
+        if stats is None:
+            return render(self, context)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_seconds += time.perf_counter() - started
+
+    timed_render.metrics = True
+    Template._render = timed_render
+
+
+def record(view, stats, seconds, size):
+    values = {
+        "queries": stats.queries,
+        "db_seconds": stats.db_seconds,
+        "template_seconds": stats.template_seconds,
+        "seconds": seconds,
+    }
+    if size is not None:
+        values["response_bytes"] = size
+    with lock:
+        for name, value in values.items():
+            key = (name, view)
+            if key not in histograms:
+                histograms[key] = Histogram(METRICS[name][1])
+            histograms[key].observe(value)
+        if stats.slowest_sql and (
+            stats.slowest_seconds > slowest.get(view, (0, ""))[0]
+        ):
+            slowest[view] = (stats.slowest_seconds, stats.slowest_sql)
+
+
+class RequestMetricsMiddleware:
+    """Ставится первым в MIDDLEWARE, чтобы учесть весь запрос."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        stats = current.stats = RequestStats()
+        current.request = request
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            current.stats = current.request = None
+        match = request.resolver_match
+        record(
+            match.view_name if match else "unresolved",
+            stats,
+            time.perf_counter() - started,
+            None if response.streaming else len(response.content),
+        )
+        return response
+
+
+def label(value):
+    value = value.replace("\\", "\\\\").replace('"', '\\"')
+    return value.replace("\n", "\\n")
+
+
+def exposition():
+    """Гистограммы процесса в текстовом формате Prometheus."""
+    with lock:
+        items = sorted(
+            (key, hist.counts[:], hist.sum, hist.count)
+            for key, hist in histograms.items()
+        )
+        slow = sorted(slowest.items())
+    lines = []
+    for name, (help_text, buckets) in METRICS.items():
+        metric = PREFIX + name
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (key, view), counts, total, count in items:
+            if key != name:
+                continue
+            view = label(view)
+            cumulative = 0
+            for bound, bucket in zip(buckets + ("+Inf",), counts):
+                cumulative += bucket
+                lines.append(
+                    f'{metric}_bucket{{view="{view}",le="{bound}"}} '
+                    f"{cumulative}"
+                )
+            lines.append(f'{metric}_sum{{view="{view}"}} {total}')
+            lines.append(f'{metric}_count{{view="{view}"}} {count}')
+    metric = PREFIX + "slowest_query_seconds"
+    lines.append(f"# HELP {metric} Самый медленный SQL-запрос view")
+    lines.append(f"# TYPE {metric} gauge")
+    for view, (seconds, sql) in slow:
+        lines.append(
+            f'{metric}{{view="{label(view)}",'
+            f'fingerprint="{label(fingerprint(sql))}"}} {seconds}'
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,142 @@
+"""Выборочное профилирование запросов.
+
+ProfilingMiddleware профилирует cProfile долю PROFILE_SAMPLE_RATE всех
+запросов, запросы к представлениям из PROFILE_VIEWS и запросы с
+заголовком PROFILE_HEADER с адресов INTERNAL_IPS. Для каждого такого
+запроса в PROFILE_DIR пишутся файл pstats (.prof) и свёрнутые стеки
+для flamegraph.pl (.collapsed). Хранятся PROFILE_KEEP последних пар,
+старые удаляются. Команда merge_profiles сводит их по представлениям.
+
+Если ни один способ не включён, middleware отключается при старте; в
+остальных случаях непрофилируемый запрос стоит одного random().
+"""
+import cProfile
+import os
+import pstats
+import random
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# ветки дешевле этого (мкс) сливаются в вызывающую функцию
+MIN_STACK_US = 50
+
+
+def frame_name(func):
+    filename, line, name = func
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats):
+    """Свёрнутые стеки в мкс из pstats.Stats.
+
+    cProfile хранит только рёбра вызовов, поэтому время функции делится
+    между путями к ней пропорционально времени рёбер (как в flameprof).
+    """
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+    stacks = Counter()
+    pending = [
+        ((func,), stats.stats[func][3])
+        for func, value in stats.stats.items()
+        if not value[4]
+    ]
+    while pending:
+        path, total = pending.pop()
+        _, _, own, cumulative, _ = stats.stats[path[-1]]
+        scale = total / cumulative if cumulative else 0
+        own *= scale
+        for callee, edge in callees[path[-1]]:
+            part = edge * scale
+            if callee in path or part * 1e6 < MIN_STACK_US:
+                own += part
+            else:
+                pending.append((path + (callee,), part))
+        stacks[";".join(frame_name(func) for func in path)] += own * 1e6
+    return {stack: int(us) for stack, us in stacks.items() if int(us)}
+
+
+def write_collapsed(stacks, filename):
+    with open(filename, "w") as file:
+        for stack, us in sorted(stacks.items()):
+            file.write(f"{stack} {us}\n")
+
+
+def read_collapsed(filename):
+    stacks = Counter()
+    with open(filename) as file:
+        for line in file:
+            stack, _, us = line.rstrip("\n").rpartition(" ")
+            stacks[stack] += int(us)
+    return stacks
+
+
+def rotate(directory, keep):
+    """Оставляет keep последних профилей (пар .prof и .collapsed)."""
+    dumps = sorted(
+        entry.path
+        for entry in os.scandir(directory)
+        if entry.name.endswith(".prof")
+    )
+    for path in dumps[:-keep] if keep else dumps:
+        os.remove(path)
+        collapsed = path[: -len(".prof")] + ".collapsed"
+        if os.path.exists(collapsed):
+            os.remove(collapsed)
+
+
+class ProfilingMiddleware:
+    """Профилирует представление вместе с рендером его шаблонов."""
+
+    def __init__(self, get_response):
+        if not (
+            settings.PROFILE_SAMPLE_RATE
+            or settings.PROFILE_VIEWS
+            or settings.PROFILE_HEADER
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def sampled(self, request):
+        if request.resolver_match.view_name in settings.PROFILE_VIEWS:
+            return True
+        if settings.PROFILE_HEADER in request.META:
+            return request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
+        return random.random() < settings.PROFILE_SAMPLE_RATE
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.sampled(request):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # в этом потоке уже работает другой профилировщик
+            return None
+        request.profiler = profiler
+        return None
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        profiler = getattr(request, "profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            self.dump(request.resolver_match.view_name, profiler)
+        return response
+
+    def dump(self, view, profiler):
+        directory = settings.PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        # имя начинается со времени, чтобы rotate шёл по порядку записи
+        base = os.path.join(
+            directory,
+            f"{time.time_ns()}-{os.getpid()}-{view.replace(':', '.')}",
+        )
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(base + ".prof")
+        write_collapsed(collapsed_stacks(stats), base + ".collapsed")
+        rotate(directory, settings.PROFILE_KEEP)
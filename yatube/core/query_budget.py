@@ -0,0 +1,70 @@
+"""Бюджет SQL-запросов представления.
+
+Представление объявляет, сколько запросов к базе ему положено, декоратором
+query_budget. QueryBudgetMiddleware считает запросы за время обработки
+запроса и при превышении пишет предупреждение в лог, а с настройкой
+QUERY_BUDGET_RAISE поднимает QueryBudgetExceeded. Запросы, которые
+выполняются уже при отдаче потокового ответа, не считаются.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(queries):
+    """Бюджет запросов представления; ставится над другими декораторами."""
+
+    def decorator(view):
+        view.query_budget = queries
+        return view
+
+    return decorator
+
+
+def budget_of(view):
+    return getattr(view, "query_budget", None)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    """Сверяет число запросов с бюджетом представления.
+
+    Ставится последним в MIDDLEWARE, чтобы считать только запросы
+    представления и его шаблонов (вместе с ленивой загрузкой сессии).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        budget = getattr(request, "query_budget", None)
+        if budget is not None and counter.count > budget:
+            message = (
+                f"{request.method} {request.path}: {counter.count} "
+                f"запросов при бюджете {budget}"
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = budget_of(view_func)
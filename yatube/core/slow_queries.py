@@ -0,0 +1,108 @@
+"""Журнал медленных SQL-запросов.
+
+Регистратор ставится обёрткой execute_wrapper на каждое соединение с
+базой (сигнал connection_created) и пишет в SLOW_QUERY_LOG строку JSON
+о каждом запросе не быстрее SLOW_QUERY_MS: отпечаток (SQL без
+литералов), исходный SQL, время, имя представления и ближайший кадр
+стека из posts или core. Для SQLite при первой встрече отпечатка в
+процессе к записи добавляется план EXPLAIN QUERY PLAN. Команда
+slow_queries сводит журнал по отпечаткам.
+"""
+import json
+import os
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db.backends.sqlite3.base import SQLiteCursorWrapper
+
+from .metrics import current, fingerprint
+
+APPS = ("posts", "core")
+# обёртки самого сбора статистики - не источник запроса
+SKIP = {
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ("slow_queries.py", "metrics.py", "query_budget.py")
+}
+
+lock = threading.Lock()
+explained = set()
+
+
+def current_view():
+    request = getattr(current, "request", None)
+    if request is None:
+        return "-"
+    match = request.resolver_match
+    return match.view_name if match else request.path
+
+
+def app_frame():
+    """Ближайший к запросу кадр стека из posts или core."""
+    roots = tuple(
+        os.path.join(settings.BASE_DIR, app) + os.sep for app in APPS
+    )
+    for frame, line in traceback.walk_stack(None):
+        filename = frame.f_code.co_filename
+        if filename.startswith(roots) and filename not in SKIP:
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            return f"{path}:{line} in {frame.f_code.co_name}"
+    return None
+
+
+def explain(connection, sql, params, many):
+    """План SQLite отдельным курсором, минуя обёртки и результат запроса."""
+    if connection.vendor != "sqlite" or many:
+        return None
+    cursor = connection.connection.cursor(SQLiteCursorWrapper)
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+    except connection.Database.Error:
+        return None
+    finally:
+        cursor.close()
+
+
+def record(sql, params, many, connection, elapsed):
+    entry = {
+        "fingerprint": fingerprint(sql),
+        "sql": sql,
+        "ms": round(elapsed * 1000, 3),
+        "view": current_view(),
+        "frame": app_frame(),
+        "at": time.time(),
+    }
+    with lock:
+        if entry["fingerprint"] not in explained:
+            explained.add(entry["fingerprint"])
+            entry["plan"] = explain(connection, sql, params, many)
+        with open(settings.SLOW_QUERY_LOG, "a", encoding="utf-8") as log:
+            log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def recorder(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        threshold = settings.SLOW_QUERY_MS
+        if threshold is not None and elapsed * 1000 >= threshold:
+            record(sql, params, many, context["connection"], elapsed)
+
+
+def install(sender, connection, **kwargs):
+    # соединение открывается и внутри with connection.execute_wrapper(...)
+    # middleware; их выход снимает последнюю обёртку, поэтому регистратор
+    # ставится первым, под всеми обёртками запроса
+    if recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, recorder)
+
+
+def read_log(filename):
+    with open(filename, encoding="utf-8") as log:
+        for line in log:
+            if line.strip():
+                yield json.loads(line)
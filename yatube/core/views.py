@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
+from .metrics import exposition
+
 
 def page_not_found(request, exception):
     return render(request, "core/404.html", {"path": request.path}, status=404)
@@ -11,3 +15,12 @@ def csrf_failure(request, reason=""):
 
 def server_error(request):
     return render(request, "core/500.html", {"path": request.path}, status=500)
+
+
+def metrics(request):
+    """Метрики процесса для Prometheus; только с адресов METRICS_IPS."""
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        exposition(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,296 @@
+"""Массовый импорт комментариев.
+
+Поля дерева (tree_id, lft, rght, level, path) и счётчики ответов
+считаются в памяти, строки вставляются пачками через executemany.
+Перестраиваются только деревья существующих комментариев, к которым
+прицеплены импортированные ветки. id выдаются явно, поэтому после
+вставки последовательность id сдвигается за последний из них.
+"""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .caching import (
+    bump_comments_version,
+    bump_feed_generations,
+    feed_scopes,
+)
+from .models import Comment, Post, path_step
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+LOOKUP_SIZE = 500
+COLUMNS = (
+    "id",
+    "post",
+    "author",
+    "text",
+    "created",
+    "parent",
+    "tree_id",
+    "lft",
+    "rght",
+    "level",
+    "path",
+    "reply_count",
+    "descendant_count",
+)
+CREATED = Comment._meta.get_field("created")
+
+
+def resolve_authors(usernames):
+    """id пользователей по именам; недостающие создаются без пароля."""
+    usernames = sorted(usernames)
+    authors = {}
+    for i in range(0, len(usernames), LOOKUP_SIZE):
+        authors.update(
+            User.objects.filter(
+                username__in=usernames[i:i + LOOKUP_SIZE]
+            ).values_list("username", "id")
+        )
+    missing = [name for name in usernames if name not in authors]
+    User.objects.bulk_create(
+        [
+            User(username=name, password=make_password(None))
+            for name in missing
+        ],
+        BATCH_SIZE,
+    )
+    for i in range(0, len(missing), LOOKUP_SIZE):
+        authors.update(
+            User.objects.filter(
+                username__in=missing[i:i + LOOKUP_SIZE]
+            ).values_list("username", "id")
+        )
+    return authors
+
+
+class ThreadBuilder:
+    """Раскладывает записи импорта по веткам и считает поля дерева.
+
+    Записи с циклом в parent_id или с parent_id вне импорта не попали бы
+    ни в одну ветку, поэтому на них ValueError до любой вставки; так же и
+    на ответ родителю из другого поста.
+    """
+
+    def __init__(self, records, next_id):
+        self.nodes = {record["id"]: record for record in records}
+        self.children = defaultdict(list)
+        self.roots = []
+        missing, foreign = [], []
+        for source_id, record in self.nodes.items():
+            parent_id = record.get("parent_id")
+            if parent_id in self.nodes:
+                self.children[parent_id].append(source_id)
+                if self.nodes[parent_id]["post_id"] != record["post_id"]:
+                    foreign.append(source_id)
+            elif parent_id is None or record.get("reply_to") is not None:
+                self.roots.append(source_id)
+            else:
+                missing.append(source_id)
+        if missing:
+            raise ValueError(
+                f"Родителей нет в импорте у записей {sorted(missing)}"
+            )
+        if foreign:
+            raise ValueError(
+                f"Родитель из другого поста у записей {sorted(foreign)}"
+            )
+        cyclic = set(self.nodes) - self.reachable()
+        if cyclic:
+            raise ValueError(f"Цикл в parent_id у записей {sorted(cyclic)}")
+        self.authors = resolve_authors(
+            {record["author"] for record in self.nodes.values()}
+        )
+        self.now = CREATED.get_db_prep_save(timezone.now(), connection)
+        self.ids = {}
+        self.next_id = next_id
+
+    def reachable(self):
+        """id записей, до которых можно дойти от корней."""
+        seen = set(self.roots)
+        stack = list(self.roots)
+        while stack:
+            for child in self.children[stack.pop()]:
+                seen.add(child)
+                stack.append(child)
+        return seen
+
+    def thread(self, root, tree_id, level, prefix, parent):
+        """Комментарии ветки root; id выдаются в порядке обхода в глубину,
+        поэтому порядок путей совпадает с порядком обхода."""
+        stack = [(root, level, prefix, parent, False)]
+        left = {}
+        counter = 1
+        while stack:
+            source_id, level, prefix, parent, done = stack.pop()
+            if not done:
+                self.ids[source_id] = self.next_id
+                self.next_id += 1
+                left[source_id] = counter
+                counter += 1
+                stack.append((source_id, level, prefix, parent, True))
+                path = prefix + path_step(self.ids[source_id])
+                for child in reversed(self.children[source_id]):
+                    stack.append(
+                        (child, level + 1, path, self.ids[source_id], False)
+                    )
+                continue
+            yield self.comment(
+                source_id,
+                parent,
+                tree_id=tree_id,
+                lft=left[source_id],
+                rght=counter,
+                level=level,
+                path=prefix + path_step(self.ids[source_id]),
+            )
+            counter += 1
+
+    def comment(self, source_id, parent, **tree_fields):
+        """Строка для INSERT в порядке COLUMNS."""
+        record = self.nodes[source_id]
+        created = self.now
+        if record.get("created"):
+            created = CREATED.get_db_prep_save(
+                CREATED.to_python(record["created"]), connection
+            )
+        return (
+            self.ids[source_id],
+            record["post_id"],
+            self.authors[record["author"]],
+            record["text"],
+            created,
+            parent,
+            tree_fields["tree_id"],
+            tree_fields["lft"],
+            tree_fields["rght"],
+            tree_fields["level"],
+            tree_fields["path"],
+            len(self.children[source_id]),
+            (tree_fields["rght"] - tree_fields["lft"] - 1) // 2,
+        )
+
+
+def insert_rows(rows, model=Comment, fields=COLUMNS):
+    """Вставка пачки строк одним executemany, минуя сборку моделей ORM."""
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(name).column for name in fields]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(model._meta.db_table),
+        ", ".join(quote(column) for column in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def reset_sequences(*models):
+    """Сдвигает последовательности id за строки, вставленные с явным id."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def import_comments(records, batch_size=BATCH_SIZE):
+    """Импортирует записи {"id", "parent_id", "post_id", "author", "text"}.
+
+    parent_id ссылается на id другой записи импорта. Запись без parent_id
+    становится корнем, а если у неё задан "reply_to" - ответом на
+    существующий комментарий. Циклы, parent_id вне импорта, reply_to на
+    несуществующий комментарий и родитель из другого поста - ValueError.
+    Необязательное поле "created" сохраняется. Возвращает словарь:
+    id записи -> id комментария.
+    """
+    with transaction.atomic():
+        builder = ThreadBuilder(
+            records, (Comment.objects.aggregate(m=Max("id"))["m"] or 0) + 1
+        )
+        targets = Comment.objects.in_bulk(
+            {builder.nodes[root].get("reply_to") for root in builder.roots}
+            - {None}
+        )
+        check_targets(builder, targets)
+        tree_id = (Comment.objects.aggregate(m=Max("tree_id"))["m"] or 0) + 1
+        batch = []
+        for root in builder.roots:
+            target = targets.get(builder.nodes[root].get("reply_to"))
+            if target is None:
+                thread = builder.thread(root, tree_id, 0, "", None)
+                tree_id += 1
+            else:
+                thread = builder.thread(
+                    root, target.tree_id, target.level + 1, target.path,
+                    target.pk,
+                )
+            size = 0
+            for comment in thread:
+                batch.append(comment)
+                size += 1
+                if len(batch) >= batch_size:
+                    insert_rows(batch)
+                    batch = []
+            if target is not None:
+                attach(target, size)
+        insert_rows(batch)
+        reset_sequences(Comment)
+        count_posts(builder.nodes[source_id] for source_id in builder.ids)
+
+        for tree in {target.tree_id for target in targets.values()}:
+            Comment.objects.partial_rebuild(tree)
+    post_ids = {record["post_id"] for record in builder.nodes.values()}
+    for post_id in post_ids:
+        bump_comments_version(post_id)
+    for post in Post.objects.filter(pk__in=post_ids).values_list(
+        "author_id", "group_id"
+    ):
+        bump_feed_generations(feed_scopes(*post))
+    return builder.ids
+
+
+def check_targets(builder, targets):
+    """reply_to корней указывает на комментарий того же поста."""
+    missing, foreign = [], []
+    for root in builder.roots:
+        record = builder.nodes[root]
+        if record.get("reply_to") is None:
+            continue
+        target = targets.get(record["reply_to"])
+        if target is None:
+            missing.append(root)
+        elif target.post_id != record["post_id"]:
+            foreign.append(root)
+    if missing:
+        raise ValueError(f"reply_to не найден у записей {sorted(missing)}")
+    if foreign:
+        raise ValueError(
+            f"reply_to на комментарий другого поста у записей "
+            f"{sorted(foreign)}"
+        )
+
+
+def count_posts(records):
+    """Прибавляет импортированные комментарии к comment_count постов."""
+    added = defaultdict(int)
+    for record in records:
+        added[record["post_id"]] += 1
+    for post_id, count in added.items():
+        Post.objects.filter(pk=post_id).update(
+            comment_count=F("comment_count") + count
+        )
+
+
+def attach(target, size):
+    """Учитывает прицепленную ветку в счётчиках target и его предков."""
+    Comment.objects.filter(pk=target.pk).update(
+        reply_count=F("reply_count") + 1
+    )
+    Comment.objects.filter(pk__in=target.ancestor_ids() + [target.pk]).update(
+        descendant_count=F("descendant_count") + size
+    )
@@ -0,0 +1,164 @@
+"""Кэш отрендеренных фрагментов дерева комментариев и лент постов.
+
+Ключ фрагмента содержит версию дерева поста. Сигналы Comment повышают
+версию, поэтому устаревшие фрагменты больше не читаются и со временем
+вытесняются из кэша сами. Ленты устроены так же: ключ страницы содержит
+поколение области (вся лента, группа, автор), которое повышают сигналы
+Post и изменение числа комментариев поста.
+
+Анонимным читателям страница отдаётся из кэша целиком (anonymous_page).
+ETag страницы складывается из её адреса, версий и поколений её данных,
+так что повторный запрос с If-None-Match получает 304 без рендера
+шаблона. Last-Modified не отдаётся: правка поста не меняет ни одной
+даты, по которой его можно было бы посчитать. Вошедшим пользователям
+из кэша берётся общая часть страницы поста (cached_post), а кнопки и
+формы с CSRF-токеном дорисовываются на каждый запрос.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+HITS_KEY = "comment_cache:hits"
+MISSES_KEY = "comment_cache:misses"
+
+
+def version_key(post_id):
+    return f"comment_cache:version:{post_id}"
+
+
+def comments_version(post_id):
+    # начальная версия от времени: если ключ версии вытеснят, новая
+    # версия не совпадёт со старыми фрагментами
+    return cache.get_or_set(
+        version_key(post_id), int(time.time() * 1000), None
+    )
+
+
+def bump_comments_version(post_id):
+    try:
+        cache.incr(version_key(post_id))
+    except ValueError:
+        comments_version(post_id)
+
+
+def count(key):
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+def cached_comments(post_id, part, render):
+    """HTML фрагмента part из кэша; render() вызывается только при промахе."""
+    part = hashlib.md5(part.encode()).hexdigest()
+    key = f"comment_cache:{post_id}:{comments_version(post_id)}:{part}"
+    html = cache.get(key)
+    if html is None:
+        count(MISSES_KEY)
+        html = render()
+        cache.set(key, html, settings.COMMENT_CACHE_TIMEOUT)
+    else:
+        count(HITS_KEY)
+    return html
+
+
+def comment_cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else 0,
+    }
+
+
+def feed_scopes(author_id, *group_ids):
+    """Области лент, где виден пост автора author_id из групп group_ids."""
+    groups = [group_id for group_id in dict.fromkeys(group_ids) if group_id]
+    return ["all", f"author:{author_id}"] + [
+        f"group:{group_id}" for group_id in groups
+    ]
+
+
+def generation_key(scope):
+    return f"feed_cache:generation:{scope}"
+
+
+def feed_generation(scope):
+    return cache.get_or_set(
+        generation_key(scope), int(time.time() * 1000), None
+    )
+
+
+def bump_feed_generations(scopes):
+    for scope in scopes:
+        try:
+            cache.incr(generation_key(scope))
+        except ValueError:
+            feed_generation(scope)
+
+
+def cached_feed(view, scope, part, render):
+    """HTML постов страницы part ленты view; render() - при промахе."""
+    part = hashlib.md5(part.encode()).hexdigest()
+    key = f"feed_cache:{view}:{scope}:{feed_generation(scope)}:{part}"
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, html, settings.FEED_CACHE_TIMEOUT)
+    return html
+
+
+def cached_post(post_id, versions, render):
+    """Общая часть страницы поста из кэша; render() - только при промахе."""
+    versions = hashlib.md5(str(versions).encode()).hexdigest()
+    key = f"post_cache:{post_id}:{versions}"
+    shared = cache.get(key)
+    if shared is None:
+        shared = render()
+        cache.set(key, shared, settings.FEED_CACHE_TIMEOUT)
+    return shared
+
+
+def anonymous_page(page_version):
+    """Кэш страницы целиком и условный GET для анонимных читателей.
+
+    page_version(**kwargs) не больше чем одним запросом находит список
+    версий и поколений кэша данных страницы; None - страницы нет, её
+    ответ (404) не кэшируется.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            if request.method not in ("GET", "HEAD") or (
+                request.user.is_authenticated
+            ):
+                return view(request, **kwargs)
+            versions = page_version(**kwargs)
+            if versions is None:
+                return view(request, **kwargs)
+            digest = hashlib.md5(
+                f"{request.get_full_path()}:{versions}".encode()
+            ).hexdigest()
+            etag = quote_etag(digest)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                key = f"page_cache:{digest}"
+                response = cache.get(key)
+            if response is None:
+                response = view(request, **kwargs)
+                # ответ с cookie (сессия, csrf) принадлежит одному клиенту
+                if response.status_code != 200 or response.cookies:
+                    return response
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+            response["ETag"] = etag
+            patch_vary_headers(response, ("Cookie",))
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,38 @@
+"""Проверки настроек кэша.
+
+Версии и поколения кэша хранятся в CACHES["default"]. В кэше процесса
+(LocMemCache) сигналы повышают их только в воркере, который записал
+изменение, а остальные воркеры отдают свои копии, пока не истечёт
+время жизни. Поэтому с таким кэшем время жизни не больше
+LOCAL_CACHE_TIMEOUT, а долгое - только с общим кэшем (Redis, Memcached).
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCAL_BACKENDS = ("django.core.cache.backends.locmem.LocMemCache",)
+TIMEOUTS = (
+    "FEED_CACHE_TIMEOUT",
+    "COMMENT_CACHE_TIMEOUT",
+    "PAGE_CACHE_TIMEOUT",
+    "POST_COUNT_TIMEOUT",
+)
+
+
+@register(Tags.caches)
+def check_cache_timeouts(app_configs, **kwargs):
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend not in LOCAL_BACKENDS:
+        return []
+    return [
+        Error(
+            f"{name} = {getattr(settings, name)} с кэшем процесса {backend}: "
+            f"другие воркеры не увидят сброса версий",
+            hint=(
+                "Настройте общий кэш (Redis, Memcached) или сократите время "
+                f"до LOCAL_CACHE_TIMEOUT = {settings.LOCAL_CACHE_TIMEOUT}"
+            ),
+            id="posts.E001",
+        )
+        for name in TIMEOUTS
+        if getattr(settings, name) > settings.LOCAL_CACHE_TIMEOUT
+    ]
@@ -0,0 +1,117 @@
+"""Хранилища дерева комментариев.
+
+По умолчанию дерево ведёт MPTT: каждый ответ сдвигает lft/rght у всех
+последующих узлов того же tree_id. Бэкенд "path" хранит у комментария
+материализованный путь и вставляет ответ за постоянное число запросов.
+Бэкенд выбирается настройкой COMMENT_TREE_BACKEND.
+
+Бэкенд "path" не ведёт поля MPTT: в деревьях, куда он вставлял ответы,
+lft/rght/level неверны (у братьев одинаковые lft), пока их не починит
+check_comment_trees. Такие деревья запоминаются в таблице DirtyTree в
+той же транзакции, что и ответ, и команда проверяет их первыми. Всё,
+что читает дерево в порядке MPTT (get_ancestors, индексы (tree_id,
+lft), бэкенд "mptt"), до починки видит испорченное дерево; перед
+возвратом к "mptt" нужен полный проход check_comment_trees.
+"""
+from django.conf import settings
+
+from .models import Comment, DirtyTree
+
+# порядки корневых веток; каждому соответствует индекс Comment.Meta
+ROOT_ORDERS = {
+    "oldest": ("created", "id"),
+    "newest": ("-created", "-id"),
+    "replies": ("-descendant_count", "-id"),
+}
+
+
+class CommentTree:
+    """Общие выборки; order - порядок обхода дерева в глубину."""
+
+    order = ()
+
+    def subtree(self, post):
+        return post.comments.order_by(*self.order)
+
+    def roots(self, post):
+        return post.comments.filter(parent=None).order_by(*self.order)
+
+    def children(self, comment):
+        return comment.children.order_by(*self.order)
+
+
+class MPTTTree(CommentTree):
+    """Дерево на полях lft/rght, которые ведёт django-mptt."""
+
+    name = "mptt"
+    order = ("tree_id", "lft")
+
+    def insert(self, comment):
+        comment.save()
+        return comment
+
+    def ancestors(self, comment):
+        return comment.get_ancestors()
+
+    def descendants(self, comment):
+        return comment.get_descendants()
+
+
+class PathTree(CommentTree):
+    """Дерево на материализованном пути.
+
+    Вставка - один INSERT и один UPDATE, остальные строки не трогаются.
+    Поля lft/rght при этом становятся неверными, дерево отмечается для
+    check_comment_trees (см. начало модуля).
+    """
+
+    name = "path"
+    order = ("path",)
+
+    def insert(self, comment):
+        with Comment.objects.disable_mptt_updates():
+            comment.save()
+        if comment.parent_id is not None:
+            mark_dirty(comment.tree_id)
+        return comment
+
+    def ancestors(self, comment):
+        return Comment.objects.filter(
+            pk__in=comment.ancestor_ids()
+        ).order_by("path")
+
+    def descendants(self, comment):
+        return (
+            Comment.objects.filter(
+                post_id=comment.post_id, path__startswith=comment.path
+            )
+            .exclude(pk=comment.pk)
+            .order_by("path")
+        )
+
+
+def mark_dirty(tree_id):
+    # INSERT без ошибки на повторной отметке того же дерева
+    DirtyTree.objects.bulk_create(
+        [DirtyTree(tree_id=tree_id)], ignore_conflicts=True
+    )
+
+
+def dirty_trees():
+    """Отмеченные деревья; отметка снимается unmark_dirty перед починкой."""
+    return set(DirtyTree.objects.values_list("tree_id", flat=True))
+
+
+def unmark_dirty(tree_id):
+    # до починки: отметка, поставленная во время неё, останется
+    DirtyTree.objects.filter(tree_id=tree_id).delete()
+
+
+BACKENDS = {
+    MPTTTree.name: MPTTTree,
+    PathTree.name: PathTree,
+}
+
+
+def get_tree():
+    return BACKENDS[getattr(settings, "COMMENT_TREE_BACKEND", "mptt")]()
@@ -0,0 +1,155 @@
+"""Число постов в лентах для пагинации.
+
+COUNT ленты кэшируется по области: вся лента, группа, автор или
+подписки пользователя. Сигналы Post и Follow удаляют ключи затронутых
+областей. Для всей ленты вместо COUNT можно брать оценку из статистики
+таблицы (POST_COUNT_ESTIMATE): номера последних страниц тогда примерные.
+Число постов рисует только номера страниц: страница вырезается по
+смещению своего номера, а увиденные на ней посты поправляют число.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+
+from .caching import feed_scopes
+from .models import AuthorFeed, Follow, Post
+
+ELLIPSIS = "…"
+
+
+def count_key(scope):
+    return f"post_count:{scope}"
+
+
+def post_scopes(author_id, *group_ids):
+    """Области, в которые попадает пост автора author_id из групп group_ids."""
+    scopes = feed_scopes(author_id, *group_ids)
+    if AuthorFeed.objects.filter(author_id=author_id, pulled=True).exists():
+        # посты pull-автора не попадают в TimelineEntry подписчиков
+        return scopes
+    scopes += [
+        f"follow:{user_id}"
+        for user_id in Follow.objects.filter(author_id=author_id).values_list(
+            "user_id", flat=True
+        )
+    ]
+    return scopes
+
+
+def forget_counts(scopes):
+    cache.delete_many([count_key(scope) for scope in scopes])
+
+
+def table_estimate():
+    """Число строк таблицы постов по статистике СУБД или None."""
+    table = Post._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE relname = %s", [table]
+            )
+        elif connection.vendor == "sqlite":
+            # sqlite_stat1 появляется только после ANALYZE
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table]
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    estimate = int(float(str(row[0]).split()[0]))
+    return estimate if estimate > 0 else None
+
+
+def post_count(scope, queryset):
+    """Число постов области scope; queryset.count() только при промахе.
+
+    Без области (scope = None) число не кэшируется.
+    """
+    if scope is None:
+        return queryset.count()
+    key = count_key(scope)
+    count = cache.get(key)
+    if count is None:
+        if scope == "all" and settings.POST_COUNT_ESTIMATE:
+            count = table_estimate()
+        if count is None:
+            count = queryset.count()
+        cache.set(key, count, settings.POST_COUNT_TIMEOUT)
+    return count
+
+
+class FeedPaginator(Paginator):
+    """Paginator с кэшированным числом постов области scope."""
+
+    ELLIPSIS = ELLIPSIS
+
+    def __init__(self, object_list, per_page, scope, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scope = scope
+
+    @cached_property
+    def count(self):
+        return post_count(self.scope, self.object_list)
+
+    def validate_number(self, number):
+        """Номер за num_pages допустим: кэш и оценка отстают от ленты."""
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            number = int(number)
+            if number < 1:
+                raise
+            return number
+
+    def page(self, number):
+        """Срез по смещению номера; лишний пост показывает, есть ли дальше.
+
+        Увиденные посты поправляют число постов этого пагинатора: после
+        последней страницы оно точное, иначе - не меньше увиденного.
+        """
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        posts = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not posts and number > 1:
+            raise EmptyPage("That page contains no results")
+        seen = bottom + len(posts)
+        if len(posts) > self.per_page:
+            seen = max(self.count, seen)
+        self.count = seen
+        self.__dict__.pop("num_pages", None)
+        return self._get_page(posts[:self.per_page], number, self)
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # оценка завысила число страниц, и последней нет
+            return self.page(1)
+
+    def elided_page_range(self, number, on_each_side=2, on_ends=1):
+        """Номера вокруг number и у краёв; пропуски отмечены ELLIPSIS."""
+        num_pages = self.num_pages
+        left = max(number - on_each_side, 1)
+        right = min(number + on_each_side, num_pages)
+        pages = []
+        if left > on_ends + 2:
+            pages += list(range(1, on_ends + 1)) + [ELLIPSIS]
+        else:
+            pages += list(range(1, left))
+        pages += list(range(left, right + 1))
+        if right < num_pages - on_ends - 1:
+            pages += [ELLIPSIS] + list(
+                range(num_pages - on_ends + 1, num_pages + 1)
+            )
+        else:
+            pages += list(range(right + 1, num_pages + 1))
+        return pages
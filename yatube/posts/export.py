@@ -0,0 +1,33 @@
+"""Потоковая выгрузка комментариев в NDJSON: одна строка - один комментарий.
+
+Строки читаются итератором порциями по CHUNK_SIZE в порядке обхода
+дерева, поэтому память не зависит от размера выгрузки.
+"""
+import json
+
+from .comment_tree import get_tree
+from .models import Comment
+
+CHUNK_SIZE = 2000
+FIELDS = ("id", "post_id", "parent_id", "level", "author", "created", "text")
+
+
+def export_comments(post_id=None, since_id=None):
+    comments = Comment.objects.order_by(*get_tree().order)
+    if post_id is not None:
+        comments = comments.filter(post_id=post_id)
+    if since_id is not None:
+        comments = comments.filter(id__gt=since_id)
+    rows = comments.values_list(
+        "id",
+        "post_id",
+        "parent_id",
+        "level",
+        "author__username",
+        "created",
+        "text",
+    )
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        line = dict(zip(FIELDS, row))
+        line["created"] = line["created"].isoformat()
+        yield json.dumps(line, ensure_ascii=False) + "\n"
@@ -0,0 +1,193 @@
+"""Keyset-пагинация: страница продолжается после ключа последней записи.
+
+Курсор - непрозрачная строка с ключом последней записи страницы, поэтому
+далёкая страница стоит столько же, сколько первая: ни OFFSET, ни COUNT.
+Курсор помнит порядок, для которого выдан: с другим порядком (другой
+сортировкой ?sort=) он не действует.
+Ленты постов листаются тем же способом в обе стороны (keyset_window).
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# значения вне bigint база не примет: курсор с ними битый
+INTEGER_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+def encode_cursor(values, fields):
+    payload = {"order": ",".join(fields), "key": list(values)}
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, fields):
+    """Ключ из курсора или None, если курсор битый или выдан для
+    другого порядка."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except ValueError:
+        return None
+    if (
+        not isinstance(payload, dict)
+        or payload.get("order") != ",".join(fields)
+        or not isinstance(payload.get("key"), list)
+    ):
+        return None
+    return payload["key"]
+
+
+def key_field(queryset, name):
+    """Поле модели или аннотации, по которому идёт ключ."""
+    if name in queryset.query.annotations:
+        field = queryset.query.annotations[name].output_field
+    else:
+        field = queryset.model._meta.get_field(name)
+    return field.target_field if field.is_relation else field
+
+
+def clean_key(queryset, fields, values):
+    """Ключ из курсора, приведённый к типам полей, или None.
+
+    Значения курсора приходят от клиента: всё, что поле не принимает,
+    делает курсор битым, а не ошибкой запроса.
+    """
+    if len(values) != len(fields):
+        return None
+    key = []
+    for name, value in zip(fields, values):
+        field = key_field(queryset, name.lstrip("-"))
+        try:
+            value = field.to_python(value)
+            field.run_validators(value)
+        except (ValidationError, TypeError, ValueError, OverflowError):
+            return None
+        if value is None or (
+            isinstance(value, int) and value not in INTEGER_RANGE
+        ):
+            return None
+        key.append(value)
+    return key
+
+
+def after(fields, values):
+    """Условие "ключ строго после values" для упорядочивания по fields.
+
+    Поле с префиксом "-" упорядочено по убыванию.
+    """
+    condition = Q()
+    for index in reversed(range(len(fields))):
+        name = fields[index].lstrip("-")
+        lookup = "lt" if fields[index].startswith("-") else "gt"
+        step = Q(**{f"{name}__{lookup}": values[index]})
+        if index < len(fields) - 1:
+            step |= Q(**{name: values[index]}) & condition
+        condition = step
+    return condition
+
+
+def reverse_order(fields):
+    return [
+        name[1:] if name.startswith("-") else "-" + name for name in fields
+    ]
+
+
+def key(obj, fields):
+    return [getattr(obj, name.lstrip("-")) for name in fields]
+
+
+def keyset_page(queryset, fields, cursor, size):
+    """Страница из size записей после cursor и курсор следующей страницы."""
+    queryset = queryset.order_by(*fields)
+    values = decode_cursor(cursor, fields)
+    if values is not None:
+        values = clean_key(queryset, fields, values)
+    if values is not None:
+        queryset = queryset.filter(after(fields, values))
+    items = list(queryset[:size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = encode_cursor(key(items[-1], fields), fields)
+    return items, next_cursor
+
+
+def cursor_before(queryset, fields, obj):
+    """Курсор, с которого страница начинается ровно с obj."""
+    backwards = reverse_order(fields)
+    previous = (
+        queryset.filter(after(backwards, key(obj, fields)))
+        .order_by(*backwards)
+        .first()
+    )
+    if previous is None:
+        return None
+    return encode_cursor(key(previous, fields), fields)
+
+
+class KeysetPage:
+    """Страница с курсорами соседних страниц вместо номеров.
+
+    Курсор помнит направление: ">" - после ключа, "<" - перед ключом.
+    """
+
+    keyset = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def keyset_window(queryset, fields, cursor, size):
+    """KeysetPage из size записей по курсору в любую сторону."""
+    values = decode_cursor(cursor, fields)
+    direction = None
+    if values and values[0] in ("<", ">"):
+        direction, values = values[0], clean_key(queryset, fields, values[1:])
+    if values is None or direction is None:
+        values = None
+    backwards = values is not None and direction == "<"
+    order = reverse_order(fields) if backwards else list(fields)
+    queryset = queryset.order_by(*order)
+    if values is not None:
+        queryset = queryset.filter(after(order, values))
+    items = list(queryset[:size + 1])
+    more = len(items) > size
+    items = items[:size]
+    if backwards:
+        items.reverse()
+        has_next, has_previous = True, more
+    else:
+        has_next, has_previous = more, values is not None
+    if not items:
+        return KeysetPage(items, None, None)
+    return KeysetPage(
+        items,
+        encode_cursor([">"] + key(items[-1], fields), fields)
+        if has_next else None,
+        encode_cursor(["<"] + key(items[0], fields), fields)
+        if has_previous else None,
+    )
@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts.bulk_import import BATCH_SIZE, import_comments
+from posts.models import Post
+
+from .bench_comment_tree import Rollback, random_records
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Измеряет скорость массового импорта комментариев (строк/с)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000000)
+        parser.add_argument("--thread-size", type=int, default=1000)
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        author = User.objects.create(username="bench_comment_import")
+        post = Post.objects.create(text="bench", author=author)
+        records = list(
+            random_records(
+                post.id,
+                author.username,
+                options["rows"],
+                options["thread_size"],
+                random.Random(options["seed"]),
+            )
+        )
+        started = time.perf_counter()
+        import_comments(records, options["batch_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"rows\t{options['rows']}\nseconds\t{elapsed:.2f}\n"
+            f"rows_per_second\t{options['rows'] / elapsed:.0f}"
+        )
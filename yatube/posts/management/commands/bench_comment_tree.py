@@ -0,0 +1,106 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from posts.bulk_import import import_comments
+from posts.comment_tree import BACKENDS
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+def random_records(post_id, author, size, thread_size, rnd):
+    """Ветки по thread_size записей; родитель - любая предыдущая запись."""
+    for start in range(0, size, thread_size):
+        count = min(thread_size, size - start)
+        for node in range(count):
+            yield {
+                "id": start + node,
+                "parent_id": start + rnd.randrange(node) if node else None,
+                "post_id": post_id,
+                "author": author,
+                "text": "bench",
+            }
+
+
+class Command(BaseCommand):
+    help = "Сравнивает вставку и чтение в бэкендах дерева комментариев"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[10000, 100000, 1000000]
+        )
+        parser.add_argument("--thread-size", type=int, default=1000)
+        parser.add_argument("--inserts", type=int, default=200)
+        parser.add_argument("--reads", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            "size\tbackend\tinsert_ms\tinsert_queries\t"
+            "ancestors_ms\tdescendants_ms"
+        )
+        for size in options["sizes"]:
+            try:
+                with transaction.atomic():
+                    self.run_size(size, options)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run_size(self, size, options):
+        rnd = random.Random(options["seed"])
+        author = User.objects.create(username="bench_comment_tree")
+        post = Post.objects.create(text="bench", author=author)
+        ids = list(
+            import_comments(
+                random_records(
+                    post.id, author.username, size, options["thread_size"], rnd
+                )
+            ).values()
+        )
+        for name, backend in BACKENDS.items():
+            tree = backend()
+            targets = Comment.objects.in_bulk(
+                rnd.sample(ids, min(options["inserts"], size))
+            )
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                for parent in targets.values():
+                    tree.insert(
+                        Comment(
+                            post=post, author=author, text="reply",
+                            parent=parent,
+                        )
+                    )
+            insert_time = time.perf_counter() - started
+
+            sample = Comment.objects.in_bulk(
+                rnd.sample(ids, min(options["reads"], size))
+            )
+            started = time.perf_counter()
+            for comment in sample.values():
+                list(tree.ancestors(comment))
+            ancestors_time = time.perf_counter() - started
+            roots = Comment.objects.filter(
+                post=post, parent=None
+            ).order_by("?")[:options["reads"]]
+            started = time.perf_counter()
+            for comment in roots:
+                list(tree.descendants(comment))
+            descendants_time = time.perf_counter() - started
+
+            self.stdout.write(
+                f"{size}\t{name}\t"
+                f"{insert_time * 1000 / len(targets):.3f}\t"
+                f"{len(queries) / len(targets):.1f}\t"
+                f"{ancestors_time * 1000 / len(sample):.3f}\t"
+                f"{descendants_time * 1000 / len(roots):.3f}"
+            )
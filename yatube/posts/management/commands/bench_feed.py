@@ -0,0 +1,158 @@
+import random
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from posts.keyset import keyset_window
+from posts.models import AuthorFeed, Follow, Post, TimelineEntry
+from posts.timeline import TIMELINE_ORDER, backfill, timeline_posts
+from posts.views import POST_NUMBER
+
+from .bench_comment_tree import Rollback
+from .stress_comments import percentile
+
+User = get_user_model()
+
+SCENARIOS = ("uniform", "skewed", "celebrity")
+# порог, при котором все авторы раскладываются при записи
+PUSH_ONLY = 10 ** 9
+
+
+def followed_authors(scenario, authors, follows, rnd):
+    """Авторы одного читателя по распределению подписчиков scenario."""
+    if scenario == "uniform":
+        return rnd.sample(authors, follows)
+    if scenario == "celebrity":
+        return [authors[0]] + rnd.sample(authors[1:], follows - 1)
+    # skewed: вес автора обратно пропорционален его рангу (Zipf)
+    weights = [1 / rank for rank in range(1, len(authors) + 1)]
+    chosen = set()
+    while len(chosen) < follows:
+        chosen.update(rnd.choices(authors, weights, k=follows - len(chosen)))
+    return list(chosen)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает ленту подписок в режимах push, pull и hybrid при "
+        "разных распределениях подписчиков"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS
+        )
+        parser.add_argument("--authors", type=int, default=200)
+        parser.add_argument("--readers", type=int, default=2000)
+        parser.add_argument(
+            "--follows", type=int, default=50, help="подписок на читателя"
+        )
+        parser.add_argument(
+            "--posts", type=int, default=20, help="постов на автора"
+        )
+        parser.add_argument(
+            "--threshold", type=int, default=200, help="порог hybrid"
+        )
+        parser.add_argument("--writes", type=int, default=100)
+        parser.add_argument("--reads", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            "scenario\tmode\tpulled_authors\ttimeline_rows\t"
+            "write_p50_ms\twrite_p99_ms\tread_p50_ms\tread_p99_ms\t"
+            "read_queries"
+        )
+        modes = (
+            ("push", PUSH_ONLY),
+            ("hybrid", options["threshold"]),
+            ("pull", 0),
+        )
+        for scenario in options["scenarios"]:
+            for mode, threshold in modes:
+                try:
+                    with transaction.atomic(), override_settings(
+                        FEED_PULL_THRESHOLD=threshold
+                    ):
+                        self.run_mode(scenario, mode, options)
+                        raise Rollback
+                except Rollback:
+                    pass
+
+    def run_mode(self, scenario, mode, options):
+        rnd = random.Random(options["seed"])
+        User.objects.bulk_create(
+            User(username=f"bench_feed_author{i}")
+            for i in range(options["authors"])
+        )
+        User.objects.bulk_create(
+            User(username=f"bench_feed_reader{i}")
+            for i in range(options["readers"])
+        )
+        authors = list(
+            User.objects.filter(
+                username__startswith="bench_feed_author"
+            ).values_list("id", flat=True)
+        )
+        readers = list(
+            User.objects.filter(username__startswith="bench_feed_reader")
+        )
+        Post.objects.bulk_create(
+            Post(text="bench", author_id=author_id)
+            for author_id in authors
+            for _ in range(options["posts"])
+        )
+        Follow.objects.bulk_create(
+            Follow(user_id=reader.pk, author_id=author_id)
+            for reader in readers
+            for author_id in followed_authors(
+                scenario, authors, options["follows"], rnd
+            )
+        )
+        # bulk_create минует сигналы: режимы и ленты строятся здесь
+        call_command("rebalance_feeds", stdout=StringIO())
+        for author_id in AuthorFeed.objects.filter(
+            pulled=False
+        ).values_list("author_id", flat=True):
+            backfill(
+                author_id,
+                Follow.objects.filter(author_id=author_id).values_list(
+                    "user_id", flat=True
+                ),
+            )
+
+        # автор нового поста выбирается с весом по числу подписчиков
+        writers = list(Follow.objects.values_list("author_id", flat=True))
+        writes = []
+        for _ in range(options["writes"]):
+            started = time.perf_counter()
+            Post.objects.create(text="new", author_id=rnd.choice(writers))
+            writes.append(time.perf_counter() - started)
+
+        reads = []
+        queries = 0
+        sample = rnd.sample(readers, min(options["reads"], len(readers)))
+        for reader in sample:
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as captured:
+                posts = timeline_posts(reader).select_related(
+                    "author", "group"
+                )
+                list(keyset_window(posts, TIMELINE_ORDER, None, POST_NUMBER))
+            reads.append(time.perf_counter() - started)
+            queries += len(captured)
+
+        self.stdout.write(
+            f"{scenario}\t{mode}\t"
+            f"{AuthorFeed.objects.filter(pulled=True).count()}\t"
+            f"{TimelineEntry.objects.count()}\t"
+            f"{percentile(writes, 0.5) * 1000:.2f}\t"
+            f"{percentile(writes, 0.99) * 1000:.2f}\t"
+            f"{percentile(reads, 0.5) * 1000:.2f}\t"
+            f"{percentile(reads, 0.99) * 1000:.2f}\t"
+            f"{queries / len(reads):.1f}"
+        )
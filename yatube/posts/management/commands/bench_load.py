@@ -0,0 +1,371 @@
+import json
+import multiprocessing
+import random
+import subprocess
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from posts import urls as posts_urls
+from posts.models import Comment, Group, Post
+from posts.seeding import zipf_weights
+from users import urls as users_urls
+
+from .stress_comments import HOST, percentile, setup_worker
+
+User = get_user_model()
+
+# logout сбросил бы сессию остальных запросов воркера
+ANONYMOUS_ONLY = {"users:logout"}
+LOGIN_ONLY = {
+    "posts:post_create",
+    "posts:post_edit",
+    "posts:add_comment",
+    "posts:add_comment_child",
+    "posts:follow_index",
+    "posts:profile_follow",
+    "posts:profile_unfollow",
+    "users:password_change",
+    "users:password_change/done",
+}
+STAFF_ONLY = {"posts:comment_export", "posts:comment_cache"}
+# формы, которые кроме GET замеряются и отправкой
+FORMS = {
+    "posts:post_create",
+    "posts:post_edit",
+    "posts:add_comment",
+    "posts:add_comment_child",
+}
+WRITES = FORMS | {"posts:profile_follow", "posts:profile_unfollow"}
+SAMPLE_FIELDS = {
+    "posts": (Post, ("id",)),
+    "comments": (Comment, ("post_id", "id")),
+    "groups": (Group, ("id", "slug")),
+    "users": (User, ("username",)),
+}
+
+
+def url_patterns():
+    """(имя URL, маршрут) каждого представления posts.urls и users.urls."""
+    for module in (posts_urls, users_urls):
+        for pattern in module.urlpatterns:
+            yield f"{module.app_name}:{pattern.name}", pattern.pattern
+
+
+def sample(model, fields, size, rnd):
+    """До size случайных строк model по случайным id без ORDER BY RANDOM()."""
+    top = model.objects.order_by("-pk").values_list("pk", flat=True).first()
+    if top is None:
+        return []
+    ids = rnd.sample(range(1, top + 1), min(size * 2, top))
+    rows = model.objects.in_bulk(ids).values()
+    return [
+        tuple(getattr(row, field) for field in fields)
+        for row in sorted(rows, key=lambda row: row.pk)[:size]
+    ]
+
+
+class Case:
+    """Запросы к одному URL от имени who: anonymous, user или staff."""
+
+    def __init__(self, name, route, method, who):
+        self.name = name
+        self.converters = set(route.converters)
+        self.method = method
+        self.who = who
+
+    @property
+    def key(self):
+        return f"{self.name} {self.method} {self.who}"
+
+    def request(self, rnd, data):
+        """(метод, путь, данные POST); популярные строки - чаще."""
+
+        def pick(rows):
+            return rnd.choices(rows, cum_weights=data["weights"][len(rows)])[0]
+
+        kwargs = {}
+        names = self.converters
+        if "comment_id" in names or "id" in names:
+            post_id, comment_id = pick(data["comments"])
+            kwargs["post_id"] = post_id
+            kwargs["comment_id" if "comment_id" in names else "id"] = (
+                comment_id
+            )
+        elif "post_id" in names:
+            posts = data["own" if self.name == "posts:post_edit" else "posts"]
+            kwargs["post_id"] = pick(posts)[0]
+        if "slug" in names:
+            kwargs["slug"] = pick(data["groups"])[1]
+        if "username" in names:
+            kwargs["username"] = pick(data["users"])[0]
+        if "uidb64" in names:
+            kwargs["uidb64"], kwargs["token"] = data["reset"]
+        unknown = names - set(kwargs)
+        if unknown:
+            raise CommandError(
+                f"{self.name}: добавьте в bench_load значения для {unknown}"
+            )
+        form = None
+        if self.method == "POST":
+            form = {"text": f"bench {rnd.random()}"}
+            if self.name in ("posts:post_create", "posts:post_edit"):
+                form["group"] = pick(data["groups"])[0]
+        return self.method, reverse(self.name, kwargs=kwargs), form
+
+
+def build_cases(read_only=False, names=None):
+    cases = []
+    for name, route in url_patterns():
+        if names and name not in names:
+            continue
+        if name in STAFF_ONLY:
+            roles = ["staff"]
+        elif name in LOGIN_ONLY:
+            roles = ["user"]
+        elif name in ANONYMOUS_ONLY:
+            roles = ["anonymous"]
+        else:
+            roles = ["anonymous", "user"]
+        methods = ["GET"]
+        if name in FORMS and not read_only:
+            methods.append("POST")
+        for method in methods:
+            if read_only and method == "GET" and name in WRITES - FORMS:
+                continue
+            cases.extend(Case(name, route, method, who) for who in roles)
+    return cases
+
+
+def run_worker(requests, session):
+    """Запросы одного воркера; выполняется в потоке или процессе."""
+    client = Client(HTTP_HOST=HOST)
+    if session:
+        client.cookies[settings.SESSION_COOKIE_NAME] = session
+    latencies, statuses = [], Counter()
+    try:
+        for method, path, form in requests:
+            started = time.perf_counter()
+            try:
+                if method == "POST":
+                    response = client.post(path, form)
+                else:
+                    response = client.get(path)
+                # потоковые ответы (выгрузка) формируются при чтении
+                response.getvalue()
+                statuses[str(response.status_code)] += 1
+            except Exception:
+                statuses["error"] += 1
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connections.close_all()
+    return latencies, statuses
+
+
+def login(user):
+    client = Client(HTTP_HOST=HOST)
+    client.force_login(user)
+    return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает каждый URL posts.urls и users.urls через WSGI-обработчик "
+        "Django из пула потоков и пула процессов; пишет пропускную "
+        "способность и перцентили задержки в JSON. Запросы форм пишут "
+        "в базу - запускайте на копии, заполненной командой seed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode", nargs="+", choices=["threads", "processes"],
+            default=["threads", "processes"],
+        )
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--requests", type=int, default=50,
+            help="запросов на воркер для каждого URL",
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=5,
+            help="незамеряемых запросов на воркер перед замером",
+        )
+        parser.add_argument(
+            "--sample", type=int, default=200,
+            help="сколько постов, комментариев, групп и авторов брать",
+        )
+        parser.add_argument("--zipf", type=float, default=1.1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--username", help="пользователь (по умолчанию автор нового поста)"
+        )
+        parser.add_argument("--urls", nargs="+", help="только эти имена URL")
+        parser.add_argument(
+            "--read-only", action="store_true",
+            help="без отправки форм и подписок",
+        )
+        parser.add_argument("--out", default="bench_load.json")
+
+    def handle(self, *args, **options):
+        name = connection.settings_dict["NAME"]
+        if connection.vendor == "sqlite" and (
+            not name or name == ":memory:" or "mode=memory" in str(name)
+        ):
+            raise CommandError("Нужна база SQLite в файле, а не в памяти")
+        rnd = random.Random(options["seed"])
+        data = self.sample_data(rnd, options)
+        cases = build_cases(options["read_only"], options["urls"])
+        if not cases:
+            raise CommandError("Нет URL для замера")
+        report = {
+            "commit": git_commit(),
+            "started": timezone.now().isoformat(),
+            "options": {
+                key: options[key]
+                for key in (
+                    "workers", "requests", "warmup", "sample", "zipf",
+                    "seed", "read_only",
+                )
+            },
+            "rows": {
+                table: model.objects.count()
+                for table, (model, _) in SAMPLE_FIELDS.items()
+            },
+            "results": {},
+        }
+        self.stdout.write(
+            "mode\tcase\trequests\terrors\trps\tp50_ms\tp90_ms\tp99_ms"
+        )
+        for mode in options["mode"]:
+            report["results"][mode] = self.run_mode(
+                mode, cases, data, rnd, options
+            )
+        with open(options["out"], "w", encoding="utf-8") as out:
+            json.dump(report, out, indent=2, sort_keys=True)
+            out.write("\n")
+        self.stdout.write(f"Результаты: {options['out']}")
+
+    def sample_data(self, rnd, options):
+        size = options["sample"]
+        data = {
+            table: sample(model, fields, size, rnd)
+            for table, (model, fields) in SAMPLE_FIELDS.items()
+        }
+        empty = [table for table, rows in data.items() if not rows]
+        if empty:
+            raise CommandError(
+                f"Нет строк в {', '.join(empty)}: сначала выполните seed"
+            )
+        if options["username"]:
+            user = User.objects.get(username=options["username"])
+        else:
+            user = Post.objects.order_by("-pub_date").first().author
+        own = list(
+            Post.objects.filter(author=user)
+            .order_by("-pub_date")
+            .values_list("id")[:size]
+        )
+        staff, _ = User.objects.get_or_create(
+            username="bench_load_staff", defaults={"is_staff": True}
+        )
+        data.update(
+            own=own or data["posts"],
+            reset=(
+                urlsafe_base64_encode(force_bytes(user.pk)),
+                default_token_generator.make_token(user),
+            ),
+            sessions={
+                "anonymous": None,
+                "user": login(user),
+                "staff": login(staff),
+            },
+            weights={},
+        )
+        for rows in data.values():
+            if isinstance(rows, list):
+                data["weights"].setdefault(
+                    len(rows), zipf_weights(len(rows), options["zipf"])
+                )
+        return data
+
+    def run_mode(self, mode, cases, data, rnd, options):
+        workers = options["workers"]
+        if mode == "threads":
+            pool = ThreadPoolExecutor(workers)
+        else:
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=setup_worker,
+            )
+        results = {}
+        with pool:
+            for case in cases:
+                session = data["sessions"][case.who]
+                plans = [
+                    [
+                        case.request(rnd, data)
+                        for _ in range(options["requests"])
+                    ]
+                    for _ in range(workers)
+                ]
+                warmup = [plan[: options["warmup"]] for plan in plans]
+                list(pool.map(run_worker, warmup, [session] * workers))
+                started = time.perf_counter()
+                done = list(pool.map(run_worker, plans, [session] * workers))
+                elapsed = time.perf_counter() - started
+                results[case.key] = self.summary(done, elapsed)
+                self.write_row(mode, case.key, results[case.key])
+        return results
+
+    def summary(self, done, elapsed):
+        latencies = [value for result in done for value in result[0]]
+        statuses = Counter()
+        for _, counts in done:
+            statuses.update(counts)
+        errors = statuses["error"] + sum(
+            count for status, count in statuses.items()
+            if status.startswith("5")
+        )
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "statuses": dict(statuses),
+            "rps": round(len(latencies) / elapsed, 1),
+            "mean_ms": round(sum(latencies) * 1000 / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+            "p90_ms": round(percentile(latencies, 0.9) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+        }
+
+    def write_row(self, mode, key, result):
+        self.stdout.write(
+            f"{mode}\t{key}\t{result['requests']}\t{result['errors']}\t"
+            f"{result['rps']}\t{result['p50_ms']}\t{result['p90_ms']}\t"
+            f"{result['p99_ms']}"
+        )
@@ -0,0 +1,108 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+from posts.bulk_import import import_comments
+from posts.comment_tree import MPTTTree
+from posts.models import Comment, Post
+from posts.tree_html import render_thread
+
+from .bench_comment_tree import Rollback
+
+User = get_user_model()
+
+# та же разметка узла, что у render_thread
+RECURSETREE = Template(
+    "{% load mptt_tags %}{% recursetree nodes %}"
+    '<div id="comment{{ node.id }}">'
+    '<h3 class="mt-0"><a href="{% url \'posts:profile\' '
+    'node.author.username %}">{{ node.author.username }}</a></h3>'
+    "<p>{{ node.text }}</p>"
+    '<p><a href="#reply-form" role="button" '
+    'data-reply-to="{{ node.id }}">Ответить</a></p>'
+    '<ul class="children" id="children{{ node.id }}">{{ children }}</ul>'
+    "</div>{% endrecursetree %}"
+)
+
+
+def chain_records(post_id, author, size, depth):
+    """Ветка из size узлов: от корня цепочки ответов длиной depth."""
+    yield {
+        "id": 0,
+        "parent_id": None,
+        "post_id": post_id,
+        "author": author,
+        "text": "bench",
+    }
+    for node in range(1, size):
+        yield {
+            "id": node,
+            "parent_id": node - 1 if (node - 1) % depth else 0,
+            "post_id": post_id,
+            "author": author,
+            "text": "bench",
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает рендер ветки render_thread и {% recursetree %} при "
+        "разном числе узлов и глубине"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[1000, 10000, 50000]
+        )
+        parser.add_argument(
+            "--depths", nargs="+", type=int, default=[1, 10, 100]
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("size\tdepth\trenderer\trender_ms\tqueries")
+        for size in options["sizes"]:
+            for depth in options["depths"]:
+                try:
+                    with transaction.atomic():
+                        self.run_case(size, depth)
+                        raise Rollback
+                except Rollback:
+                    pass
+
+    def run_case(self, size, depth):
+        author = User.objects.create(username="bench_tree_render")
+        post = Post.objects.create(text="bench", author=author)
+        ids = import_comments(
+            chain_records(post.id, author.username, size, depth)
+        )
+        root = Comment.objects.get(id=ids[0])
+        tree = MPTTTree()
+
+        def thread():
+            render_thread(
+                tree.descendants(root)
+                .filter(post_id=post.id)
+                .select_related("author")
+            )
+
+        def recursetree():
+            # как в шаблоне: узлы без select_related, автор - по запросу
+            RECURSETREE.render(Context({"nodes": tree.descendants(root)}))
+
+        for name, render in (
+            ("thread", thread),
+            ("recursetree", recursetree),
+        ):
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                try:
+                    render()
+                    elapsed = f"{(time.perf_counter() - started) * 1000:.1f}"
+                except RecursionError:
+                    elapsed = "RecursionError"
+            self.stdout.write(
+                f"{size}\t{depth}\t{name}\t{elapsed}\t{len(queries)}"
+            )
@@ -0,0 +1,44 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from posts.tree_repair import BATCH_SIZE, Checkpoint, check_trees
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверяет и чинит деревья комментариев по одному tree_id "
+        "с продолжением с контрольной точки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--budget", type=float, help="время работы, секунд"
+        )
+        parser.add_argument("--chunk", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--checkpoint",
+            default=os.path.join(settings.BASE_DIR, "comment_trees.json"),
+        )
+        parser.add_argument(
+            "--check-only", action="store_true", help="только проверить"
+        )
+        parser.add_argument(
+            "--reset", action="store_true", help="начать проход заново"
+        )
+
+    def handle(self, *args, **options):
+        if options["reset"] and os.path.exists(options["checkpoint"]):
+            os.remove(options["checkpoint"])
+        checkpoint = Checkpoint(options["checkpoint"])
+        metrics = check_trees(
+            checkpoint,
+            options["budget"],
+            options["chunk"],
+            fix=not options["check_only"],
+        )
+        checkpoint.save()
+        for name, value in metrics.items():
+            self.stdout.write(f"comment_tree_{name}\t{value}")
+        self.stdout.write(f"comment_tree_checkpoint\t{checkpoint.tree_id}")
+        self.stdout.write(f"comment_tree_passes\t{checkpoint.passes}")
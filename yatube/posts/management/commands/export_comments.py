@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from posts.export import export_comments
+
+
+class Command(BaseCommand):
+    help = "Выгружает комментарии в NDJSON в порядке обхода дерева"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--post", type=int)
+        parser.add_argument(
+            "--since-id",
+            type=int,
+            help="только комментарии с id больше указанного",
+        )
+
+    def handle(self, *args, **options):
+        for line in export_comments(options["post"], options["since_id"]):
+            self.stdout.write(line, ending="")
@@ -0,0 +1,28 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from posts.bulk_import import BATCH_SIZE, import_comments
+
+
+class Command(BaseCommand):
+    help = "Импортирует комментарии из NDJSON (формат export_comments)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="файл NDJSON или - для stdin")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            lines = sys.stdin
+        else:
+            lines = open(options["path"], encoding="utf-8")
+        with lines:
+            try:
+                ids = import_comments(
+                    (json.loads(line) for line in lines if line.strip()),
+                    options["batch_size"],
+                )
+            except ValueError as error:
+                raise CommandError(error)
+        self.stdout.write(f"Импортировано комментариев: {len(ids)}")
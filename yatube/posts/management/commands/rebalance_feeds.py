@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from posts.models import AuthorFeed, Follow
+from posts.timeline import apply_threshold
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает подписчиков авторов и заново выбирает режим их "
+        "ленты (push/pull) по FEED_PULL_THRESHOLD"
+    )
+
+    def handle(self, *args, **options):
+        counts = dict(
+            Follow.objects.values("author")
+            .annotate(n=Count("id"))
+            .values_list("author", "n")
+            .order_by()
+        )
+        authors = set(counts) | set(
+            AuthorFeed.objects.values_list("author_id", flat=True)
+        )
+        switched = 0
+        for author_id in sorted(authors):
+            with transaction.atomic():
+                feed, _ = AuthorFeed.objects.select_for_update().get_or_create(
+                    author_id=author_id
+                )
+                pulled = feed.pulled
+                feed.followers = counts.get(author_id, 0)
+                apply_threshold(feed)
+            switched += feed.pulled != pulled
+        self.stdout.write(f"Переключено авторов: {switched}")
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts.caching import bump_feed_generations, feed_scopes
+from posts.models import Comment, Post
+
+BATCH_SIZE = 1000
+
+
+def count_replies(rows):
+    """Ответы и потомки по строкам (id, parent_id) одного поста."""
+    parents = dict(rows)
+    replies = dict.fromkeys(parents, 0)
+    descendants = dict.fromkeys(parents, 0)
+    for parent_id in parents.values():
+        if parent_id in replies:
+            replies[parent_id] += 1
+        while parent_id in descendants:
+            descendants[parent_id] += 1
+            parent_id = parents[parent_id]
+    return replies, descendants
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает reply_count и descendant_count комментариев "
+        "и comment_count постов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--post", type=int, nargs="*")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by("id").values_list("id", flat=True)
+        if options["post"]:
+            posts = posts.filter(id__in=options["post"])
+        fixed = fixed_posts = 0
+        for post_id in posts.iterator():
+            comments, post_fixed = self.recount(post_id)
+            fixed += comments
+            fixed_posts += post_fixed
+        self.stdout.write(f"Исправлено комментариев: {fixed}")
+        self.stdout.write(f"Исправлено постов: {fixed_posts}")
+
+    def recount(self, post_id):
+        """Чинит счётчики комментариев поста и comment_count самого поста.
+
+        Возвращает (число исправленных комментариев, исправлен ли пост).
+        """
+        with transaction.atomic():
+            post = (
+                Post.objects.select_for_update()
+                .only("comment_count", "author", "group")
+                .get(pk=post_id)
+            )
+            comments = list(
+                Comment.objects.filter(post_id=post_id)
+                .select_for_update()
+                .only("parent", "reply_count", "descendant_count")
+            )
+            replies, descendants = count_replies(
+                (comment.pk, comment.parent_id) for comment in comments
+            )
+            stale = []
+            for comment in comments:
+                if (
+                    comment.reply_count != replies[comment.pk]
+                    or comment.descendant_count != descendants[comment.pk]
+                ):
+                    comment.reply_count = replies[comment.pk]
+                    comment.descendant_count = descendants[comment.pk]
+                    stale.append(comment)
+            Comment.objects.bulk_update(
+                stale, ["reply_count", "descendant_count"], BATCH_SIZE
+            )
+            post_fixed = post.comment_count != len(comments)
+            if post_fixed:
+                Post.objects.filter(pk=post_id).update(
+                    comment_count=len(comments)
+                )
+                bump_feed_generations(
+                    feed_scopes(post.author_id, post.group_id)
+                )
+        return len(stale), post_fixed
@@ -0,0 +1,57 @@
+import re
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from posts.seeding import MAX_DEPTH, SHARES, Seeder, scale
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу пользователями, группами, постами, подписками и "
+        "деревьями комментариев в масштабе --rows строк"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=10000,
+            help="всего строк; делятся между таблицами по seeding.SHARES",
+        )
+        for name in SHARES:
+            parser.add_argument(
+                f"--{name}", type=int, help="число строк вместо доли --rows"
+            )
+        parser.add_argument("--prefix", default="seed")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--zipf", type=float, default=1.1, help="показатель Ципфа"
+        )
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--image-share", type=float, default=0.2)
+        parser.add_argument("--max-depth", type=int, default=40)
+
+    def handle(self, *args, **options):
+        if not 0 <= options["max_depth"] <= MAX_DEPTH:
+            raise CommandError(f"--max-depth: от 0 до {MAX_DEPTH}")
+        prefix = options["prefix"]
+        pattern = rf"^{re.escape(prefix)}\d+$"
+        if User.objects.filter(username__regex=pattern).exists():
+            raise CommandError(
+                f"Пользователи {prefix}N уже есть, задайте другой --prefix"
+            )
+        counts = scale(
+            options["rows"], **{name: options[name] for name in SHARES}
+        )
+        seeder = Seeder(
+            prefix, options["seed"], options["zipf"], options["days"]
+        )
+        self.stdout.write("table\trows\tseconds")
+        started = time.perf_counter()
+        for name, created in seeder.run(
+            counts, options["image_share"], options["max_depth"]
+        ):
+            now = time.perf_counter()
+            self.stdout.write(f"{name}\t{created}\t{now - started:.1f}")
+            started = now
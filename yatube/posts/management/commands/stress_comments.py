@@ -0,0 +1,184 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from posts.comment_tree import get_tree
+from posts.models import Comment, Post
+from posts.tree_repair import tree_violations
+
+User = get_user_model()
+
+HOST = "127.0.0.1"
+WRITES = ("INSERT", "UPDATE", "DELETE")
+VIOLATIONS = ("gaps", "level", "containment")
+
+
+def percentile(values, share):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[round(share * (len(values) - 1))]
+
+
+class LockTimer:
+    """execute_wrapper: время в пишущих запросах.
+
+    SQLite берёт блокировку записи на первом пишущем запросе транзакции,
+    поэтому под нагрузкой это время - в основном ожидание блокировки.
+    """
+
+    def __init__(self):
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if sql.lstrip().upper().startswith(WRITES):
+                self.seconds += time.perf_counter() - started
+
+
+def setup_worker():
+    django.setup()
+    connections.close_all()
+
+
+def run_worker(post_id, parent_ids, requests, session, seed):
+    """Шлёт requests запросов добавления комментария; поток или процесс."""
+    rnd = random.Random(seed)
+    client = Client(HTTP_HOST=HOST)
+    client.cookies[settings.SESSION_COOKIE_NAME] = session
+    latencies, errors = [], 0
+    timer = LockTimer()
+    try:
+        with connection.execute_wrapper(timer):
+            for number in range(requests):
+                url, data = pick_request(post_id, parent_ids, rnd, number)
+                started = time.perf_counter()
+                try:
+                    response = client.post(url, data)
+                    errors += response.status_code != 302
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+    finally:
+        connections.close_all()
+    return latencies, errors, timer.seconds
+
+
+def pick_request(post_id, parent_ids, rnd, number):
+    """Новая ветка, ответ через add_comment или через add_comment_child."""
+    text = {"text": f"stress {number}"}
+    url = reverse("posts:add_comment", args=(post_id,))
+    kind = rnd.random()
+    if kind < 0.1:
+        return url, text
+    parent_id = rnd.choice(parent_ids)
+    if kind < 0.55:
+        return url, {**text, "comment_id": parent_id}
+    return (
+        reverse("posts:add_comment_child", args=(post_id, parent_id)), text
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Конкурентно добавляет комментарии к одному посту из пула потоков "
+        "и пула процессов и проверяет инварианты дерева"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode", nargs="+", choices=["threads", "processes"],
+            default=["threads", "processes"],
+        )
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument(
+            "--requests", type=int, default=100, help="запросов на воркер"
+        )
+        parser.add_argument(
+            "--threads", type=int, default=5, help="веток в начале"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--keep", action="store_true", help="не удалять пост после"
+        )
+
+    def handle(self, *args, **options):
+        name = connection.settings_dict["NAME"]
+        if connection.vendor == "sqlite" and (
+            not name or name == ":memory:" or "mode=memory" in str(name)
+        ):
+            raise CommandError("Нужна база SQLite в файле, а не в памяти")
+        author, _ = User.objects.get_or_create(username="stress_comments")
+        client = Client(HTTP_HOST=HOST)
+        client.force_login(author)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.stdout.write(
+            "mode\tworkers\trequests\terrors\tseconds\trps\tp50_ms\t"
+            "p99_ms\tlock_wait_ms\t" + "\t".join(VIOLATIONS)
+        )
+        for mode in options["mode"]:
+            post = Post.objects.create(text="stress", author=author)
+            try:
+                self.run_mode(mode, post, author, session, options)
+            finally:
+                if not options["keep"]:
+                    post.delete()
+
+    def run_mode(self, mode, post, author, session, options):
+        parent_ids = [
+            get_tree().insert(
+                Comment(post=post, author=author, text="stress")
+            ).pk
+            for _ in range(options["threads"])
+        ]
+        if mode == "threads":
+            pool = ThreadPoolExecutor(options["workers"])
+        else:
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                options["workers"],
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=setup_worker,
+            )
+        started = time.perf_counter()
+        with pool:
+            results = list(
+                pool.map(
+                    run_worker,
+                    *zip(*[
+                        (post.pk, parent_ids, options["requests"], session,
+                         options["seed"] + worker)
+                        for worker in range(options["workers"])
+                    ])
+                )
+            )
+        elapsed = time.perf_counter() - started
+        latencies = [value for result in results for value in result[0]]
+        errors = sum(result[1] for result in results)
+        lock_wait = sum(result[2] for result in results)
+        violations = tree_violations(
+            list(
+                Comment.objects.filter(post=post).only(
+                    "parent", "tree_id", "lft", "rght", "level"
+                )
+            )
+        )
+        self.stdout.write(
+            f"{mode}\t{options['workers']}\t{len(latencies)}\t{errors}\t"
+            f"{elapsed:.2f}\t{len(latencies) / elapsed:.1f}\t"
+            f"{percentile(latencies, 0.5) * 1000:.1f}\t"
+            f"{percentile(latencies, 0.99) * 1000:.1f}\t"
+            f"{lock_wait * 1000:.0f}\t"
+            + "\t".join(str(violations[kind]) for kind in VIOLATIONS)
+        )
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-17 16:08
+
+from django.db import migrations, models
+
+PATH_STEP = 6
+PATH_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def path_step(pk):
+    step = ""
+    while pk:
+        pk, digit = divmod(pk, len(PATH_DIGITS))
+        step = PATH_DIGITS[digit] + step
+    return step.rjust(PATH_STEP, "0")
+
+
+def fill_paths(apps, schema_editor):
+    """Строит материализованные пути по существующим MPTT-деревьям."""
+    Comment = apps.get_model("posts", "Comment")
+    parents = dict(Comment.objects.values_list("id", "parent_id"))
+    paths = {}
+
+    def build(pk):
+        if pk not in paths:
+            parent_id = parents.get(pk)
+            prefix = build(parent_id) if parent_id in parents else ""
+            paths[pk] = prefix + path_step(pk)
+        return paths[pk]
+
+    rows = Comment.objects.order_by("tree_id", "lft").values_list(
+        "id", flat=True
+    )
+    for pk in rows.iterator():
+        Comment.objects.filter(pk=pk).update(path=build(pk))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_auto_20220213_1445'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=1020),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='posts_comme_post_id_abd11d_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-17 16:12
+
+from django.db import migrations, models
+
+
+def fill_counts(apps, schema_editor):
+    """Считает ответы и потомков по ссылкам на родителя."""
+    Comment = apps.get_model("posts", "Comment")
+    parents = dict(Comment.objects.values_list("id", "parent_id"))
+    replies = dict.fromkeys(parents, 0)
+    descendants = dict.fromkeys(parents, 0)
+    for pk, parent_id in parents.items():
+        if parent_id in replies:
+            replies[parent_id] += 1
+        while parent_id in descendants:
+            descendants[parent_id] += 1
+            parent_id = parents[parent_id]
+    for pk in parents:
+        if replies[pk] or descendants[pk]:
+            Comment.objects.filter(pk=pk).update(
+                reply_count=replies[pk], descendant_count=descendants[pk]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_comment_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='descendant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
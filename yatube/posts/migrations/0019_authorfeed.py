@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-17 17:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_author_feeds(apps, schema_editor):
+    """Считает подписчиков; все авторы пока раскладываются при записи."""
+    AuthorFeed = apps.get_model("posts", "AuthorFeed")
+    Follow = apps.get_model("posts", "Follow")
+    AuthorFeed.objects.bulk_create(
+        [
+            AuthorFeed(author_id=author_id, followers=followers)
+            for author_id, followers in Follow.objects.values("author")
+            .annotate(n=Count("id"))
+            .values_list("author", "n")
+            .order_by()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0018_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorFeed',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers', models.PositiveIntegerField(default=0)),
+                ('pulled', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(fill_author_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-17 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_authorfeed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'tree_id', 'lft'], name='posts_comme_post_id_88873f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent', 'tree_id', 'lft'], name='posts_comme_post_id_de2117_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent', 'tree_id', 'lft'], name='posts_comme_parent__013fa6_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-17 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_comment_tree_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyTree',
+            fields=[
+                ('tree_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-17 18:30
+
+from django.db import migrations, models
+import posts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_dirtytree'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(on_delete=posts.models.cascade_with_post, related_name='comments', to='posts.Post'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from mptt.models import MPTTModel, TreeForeignKey
 
 User = get_user_model()
@@ -7,6 +9,29 @@ User = get_user_model()
 
 SYMBOLS_NUMBER = 15
 
+PATH_STEP = 6
+PATH_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def path_step(pk):
+    """Сегмент материализованного пути: id в base36 фиксированной ширины."""
+    step = ""
+    while pk:
+        pk, digit = divmod(pk, len(PATH_DIGITS))
+        step = PATH_DIGITS[digit] + step
+    return step.rjust(PATH_STEP, "0")
+
+
+def cascade_with_post(collector, field, sub_objs, using):
+    """CASCADE, помечающий комментарии, удаляемые вместе с постом.
+
+    Сигналы удаления пропускают для них пересчёт счётчиков и путей:
+    все строки ветки уходят тем же запросом.
+    """
+    for comment in sub_objs:
+        comment._deleted_with_post = True
+    models.CASCADE(collector, field, sub_objs, using)
+
 
 class Group(models.Model):
 
@@ -53,6 +78,12 @@ class Post(models.Model):
         help_text="Добавьте картинку",
     )
 
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_group_id = self.__dict__.get("group_id")
+
     def __str__(self):
 
         return self.text[:SYMBOLS_NUMBER]
@@ -60,13 +91,19 @@ class Post(models.Model):
     class Meta:
 
         ordering = ["-pub_date"]
+        # ключ курсорной пагинации лент (views.POST_ORDER)
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"]),
+            models.Index(fields=["group", "-pub_date", "-id"]),
+            models.Index(fields=["author", "-pub_date", "-id"]),
+        ]
 
 
 class Comment(MPTTModel):
 
     post = models.ForeignKey(
         Post,
-        on_delete=models.CASCADE,
+        on_delete=cascade_with_post,
         related_name="comments",
     )
 
@@ -93,6 +130,96 @@ class Comment(MPTTModel):
 
     created = models.DateTimeField("Дата публикации", auto_now_add=True)
 
+    path = models.CharField(max_length=1020, blank=True, editable=False)
+
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+
+    descendant_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_parent_id = self.__dict__.get("parent_id")
+
+    def ancestor_ids(self):
+        return [
+            int(self.path[i:i + PATH_STEP], len(PATH_DIGITS))
+            for i in range(0, len(self.path) - PATH_STEP, PATH_STEP)
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        moved = not adding and self.parent_id != self._saved_parent_id
+        with transaction.atomic():
+            if moved:
+                self.refresh_from_db(fields=["path", "descendant_count"])
+                self._change_counts(-1)
+            super().save(*args, **kwargs)
+            if moved or not self.path:
+                self._set_path()
+            if adding or moved:
+                self._change_counts(1)
+            if adding:
+                Post.objects.filter(pk=self.post_id).update(
+                    comment_count=F("comment_count") + 1
+                )
+        self._saved_parent_id = self.parent_id
+
+    def _set_path(self):
+        parent_path = self.parent.path if self.parent_id else ""
+        old_path, self.path = self.path, parent_path + path_step(self.pk)
+        fields = {"path": self.path}
+        if not self.tree_id:
+            # корень, сохранённый без MPTT: своё дерево без MAX(tree_id)
+            fields["tree_id"] = self.tree_id = self.pk
+        Comment.objects.filter(pk=self.pk).update(**fields)
+        if old_path and self.descendant_count:
+            Comment.objects.filter(
+                post_id=self.post_id, path__startswith=old_path
+            ).exclude(pk=self.pk).update(
+                path=Concat(
+                    Value(self.path), Substr("path", len(old_path) + 1)
+                )
+            )
+
+    def _change_counts(self, sign):
+        """Учитывает ветку в счётчиках родителя и предков (sign = +-1)."""
+        size = sign * (1 + self.descendant_count)
+        parent_id = self.parent_id if sign > 0 else self._saved_parent_id
+        if parent_id is None:
+            return
+        Comment.objects.filter(pk=parent_id).update(
+            reply_count=F("reply_count") + sign
+        )
+        Comment.objects.filter(pk__in=self.ancestor_ids()).update(
+            descendant_count=F("descendant_count") + size
+        )
+
+    class Meta:
+
+        indexes = [
+            models.Index(fields=["post", "path"]),
+            # обход дерева MPTT (tree_id, lft): весь пост, корни, ответы
+            # поля MPTT добавляются после сборки класса, поэтому имена
+            # индексов заданы явно (Django не может вычислить их сам)
+            models.Index(
+                fields=["post", "tree_id", "lft"],
+                name="posts_comme_post_id_88873f_idx",
+            ),
+            models.Index(
+                fields=["post", "parent", "tree_id", "lft"],
+                name="posts_comme_post_id_de2117_idx",
+            ),
+            models.Index(
+                fields=["parent", "tree_id", "lft"],
+                name="posts_comme_parent__013fa6_idx",
+            ),
+            # ROOT_ORDERS: newest читает тот же индекс в обратную сторону
+            models.Index(fields=["post", "parent", "created", "id"]),
+            models.Index(
+                fields=["post", "parent", "-descendant_count", "-id"]
+            ),
+        ]
+
 
 class Follow(models.Model):
 
@@ -116,3 +243,72 @@ class Follow(models.Model):
                 fields=["user", "author"], name="unique_follower"
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """Пост автора в ленте подписок подписчика.
+
+    Строки пишутся при публикации поста и подписке (см. timeline), а
+    лента читается одним проходом по индексу (user, pub_date, post).
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+    )
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+    )
+
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_timeline_entry"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"]),
+            # отписка удаляет посты автора из ленты подписчика
+            models.Index(fields=["user", "author"]),
+        ]
+
+
+class AuthorFeed(models.Model):
+    """Как посты автора попадают в ленты подписчиков.
+
+    pulled = False - пост раскладывается в TimelineEntry подписчиков при
+    публикации, True - лента читает посты автора сама при показе.
+    """
+
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="feed",
+    )
+
+    followers = models.PositiveIntegerField(default=0)
+
+    pulled = models.BooleanField(default=False)
+
+
+class DirtyTree(models.Model):
+    """Дерево комментариев с неверными полями MPTT.
+
+    Строку пишет бэкенд "path" при вставке ответа, снимает
+    check_comment_trees перед починкой дерева (см. comment_tree).
+    """
+
+    tree_id = models.PositiveIntegerField(primary_key=True)
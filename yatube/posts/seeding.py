@@ -0,0 +1,349 @@
+"""Генератор данных продакшен-масштаба для локальных замеров.
+
+Пользователи, группы, посты (часть с картинками), подписки и деревья
+комментариев создаются пачками в обход сигналов и сборки моделей ORM.
+Популярность распределена по Ципфу: у первых пользователей больше
+всего постов и подписчиков, первые посты собирают больше комментариев,
+первые группы - больше постов. Ленты подписок (AuthorFeed,
+TimelineEntry) заполняются сразу, как их заполнили бы сигналы.
+"""
+import io
+import random
+import re
+from collections import Counter
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from .bulk_import import (
+    BATCH_SIZE,
+    import_comments,
+    insert_rows,
+    reset_sequences,
+)
+from .models import (
+    PATH_STEP,
+    AuthorFeed,
+    Comment,
+    Follow,
+    Group,
+    Post,
+    TimelineEntry,
+)
+
+User = get_user_model()
+
+# доли строк каждой таблицы в --rows
+SHARES = {
+    "users": 0.02,
+    "groups": 0.001,
+    "posts": 0.15,
+    "follows": 0.2,
+    "comments": 0.629,
+}
+POST_FIELDS = (
+    "id", "text", "pub_date", "author", "group", "image", "comment_count",
+)
+IMAGE_POOL = 16
+IMAGE_SIZE = (960, 640)
+# форма дерева: доля новых веток и доля ответов на последний комментарий
+ROOT_SHARE = 0.1
+CHAIN_SHARE = 0.35
+# путь длиной max_length уже не вмещает ещё один шаг
+MAX_DEPTH = Comment._meta.get_field("path").max_length // PATH_STEP - 1
+# столько комментариев уходит в один вызов import_comments
+COMMENT_CHUNK = BATCH_SIZE * 20
+WORDS = (
+    "пост", "лента", "группа", "автор", "сегодня", "вчера", "новый",
+    "интересный", "город", "погода", "кот", "собака", "фото", "книга",
+    "фильм", "музыка", "код", "релиз", "ошибка", "тест", "идея", "план",
+    "и", "в", "на", "с", "не", "что", "это", "как", "очень", "почему",
+)
+
+PUB_DATE = Post._meta.get_field("pub_date")
+
+
+def scale(rows, **counts):
+    """Число строк каждой таблицы: явное из counts или доля rows."""
+    return {
+        name: counts.get(name) or max(1, round(rows * share))
+        for name, share in SHARES.items()
+    }
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса Ципфа для random.choices: ранг 1 - самый частый."""
+    return list(
+        accumulate(1 / rank ** exponent for rank in range(1, size + 1))
+    )
+
+
+def zipf_counts(total, size, exponent):
+    """Делит total между size рангами пропорционально весам Ципфа."""
+    weights = [1 / rank ** exponent for rank in range(1, size + 1)]
+    norm = sum(weights)
+    counts = [int(total * weight / norm) for weight in weights]
+    for rank in range(total - sum(counts)):
+        counts[rank % size] += 1
+    return counts
+
+
+def words(rnd, low, high):
+    return " ".join(rnd.choices(WORDS, k=rnd.randint(low, high)))
+
+
+def in_batches(rows, model, fields):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            insert_rows(batch, model, fields)
+            batch = []
+    insert_rows(batch, model, fields)
+
+
+class Seeder:
+    """Заполняет базу; каждый шаг возвращает число созданных строк."""
+
+    def __init__(self, prefix="seed", seed=0, exponent=1.1, days=365):
+        self.prefix = prefix
+        self.escaped = re.escape(prefix)
+        self.rnd = random.Random(seed)
+        self.exponent = exponent
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.user_ids = []
+        self.group_ids = []
+        self.posts = []
+
+    def add_users(self, count):
+        """Пользователи без пароля; user_ids упорядочены по популярности."""
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(username=f"{self.prefix}{number}", password=password)
+                for number in range(count)
+            ),
+            BATCH_SIZE,
+        )
+        self.user_ids = list(
+            User.objects.filter(username__regex=rf"^{self.escaped}\d+$")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        return count
+
+    def add_groups(self, count):
+        Group.objects.bulk_create(
+            (
+                Group(
+                    title=f"Группа {number}",
+                    slug=f"{self.prefix}-{number}",
+                    description=words(self.rnd, 5, 30),
+                )
+                for number in range(count)
+            ),
+            BATCH_SIZE,
+        )
+        self.group_ids = list(
+            Group.objects.filter(slug__regex=rf"^{self.escaped}-\d+$")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        return count
+
+    def images(self):
+        """Набор картинок, общий для всех постов с картинкой."""
+        names = []
+        for number in range(IMAGE_POOL):
+            image = Image.new(
+                "RGB",
+                IMAGE_SIZE,
+                tuple(self.rnd.randrange(256) for _ in range(3)),
+            )
+            draw = ImageDraw.Draw(image)
+            width, height = IMAGE_SIZE
+            for _ in range(20):
+                left, right = sorted(self.rnd.randrange(width) for _ in "lr")
+                top, bottom = sorted(self.rnd.randrange(height) for _ in "tb")
+                draw.rectangle(
+                    [left, top, right, bottom],
+                    fill=tuple(self.rnd.randrange(256) for _ in range(3)),
+                )
+            content = io.BytesIO()
+            image.save(content, "JPEG", quality=85)
+            names.append(
+                default_storage.save(
+                    f"posts/{self.prefix}-{number}.jpg",
+                    ContentFile(content.getvalue()),
+                )
+            )
+        return names
+
+    def add_posts(self, count, image_share=0.2, group_share=0.7):
+        """Посты по возрастанию даты; авторы и группы по Ципфу."""
+        authors = self.rnd.choices(
+            self.user_ids,
+            cum_weights=zipf_weights(len(self.user_ids), self.exponent),
+            k=count,
+        )
+        group_weights = zipf_weights(len(self.group_ids), self.exponent)
+        images = self.images() if image_share else []
+        next_id = (Post.objects.aggregate(m=Max("id"))["m"] or 0) + 1
+        span = self.now - self.start
+        rows = []
+        for number, author in enumerate(authors):
+            pub_date = self.start + span * (
+                (number + self.rnd.random()) / count
+            )
+            group = None
+            if self.group_ids and self.rnd.random() < group_share:
+                group = self.rnd.choices(
+                    self.group_ids, cum_weights=group_weights
+                )[0]
+            image = ""
+            if images and self.rnd.random() < image_share:
+                image = self.rnd.choice(images)
+            rows.append(
+                (
+                    next_id + number,
+                    words(self.rnd, 5, 80),
+                    PUB_DATE.get_db_prep_save(pub_date, connection),
+                    author,
+                    group,
+                    image,
+                    0,
+                )
+            )
+            self.posts.append((next_id + number, pub_date))
+        in_batches(rows, Post, POST_FIELDS)
+        reset_sequences(Post)
+        return count
+
+    def add_follows(self, count):
+        """Подписки: у каждого около count / users авторов по Ципфу."""
+        weights = zipf_weights(len(self.user_ids), self.exponent)
+        mean = count / len(self.user_ids)
+        followers = Counter()
+        rows = []
+        for user_id in self.user_ids:
+            wanted = min(
+                round(self.rnd.expovariate(1 / mean)),
+                len(self.user_ids) - 1,
+            )
+            authors = set(
+                self.rnd.choices(self.user_ids, cum_weights=weights, k=wanted)
+            )
+            authors.discard(user_id)
+            followers.update(authors)
+            rows.extend((user_id, author_id) for author_id in authors)
+        in_batches(rows, Follow, ("user", "author"))
+        threshold = settings.FEED_PULL_THRESHOLD
+        in_batches(
+            (
+                (author_id, total, total >= threshold)
+                for author_id, total in followers.items()
+            ),
+            AuthorFeed,
+            ("author", "followers", "pulled"),
+        )
+        return len(rows)
+
+    def fill_timeline(self):
+        """Ленты подписчиков push-авторов, как после timeline.backfill."""
+        quote = connection.ops.quote_name
+        entry, follow, post, feed = (
+            quote(model._meta.db_table)
+            for model in (TimelineEntry, Follow, Post, AuthorFeed)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {entry} (user_id, post_id, author_id, pub_date) "
+                f"SELECT f.user_id, p.id, p.author_id, p.pub_date "
+                f"FROM {follow} f "
+                f"JOIN {feed} a ON a.author_id = f.author_id "
+                f"JOIN {post} p ON p.author_id = f.author_id "
+                f"WHERE NOT a.pulled AND f.user_id BETWEEN %s AND %s",
+                [self.user_ids[0], self.user_ids[-1]],
+            )
+            return cursor.rowcount
+
+    def add_comments(self, count, max_depth=40):
+        """Деревья комментариев: размер дерева поста - по Ципфу."""
+        posts = self.posts[:]
+        self.rnd.shuffle(posts)
+        names = [
+            f"{self.prefix}{number}" for number in range(len(self.user_ids))
+        ]
+        records = []
+        for (post_id, pub_date), size in zip(
+            posts, zipf_counts(count, len(posts), self.exponent)
+        ):
+            if not size:
+                break
+            records.extend(
+                self.tree(post_id, pub_date, size, len(records), names,
+                          min(max_depth, MAX_DEPTH))
+            )
+            if len(records) >= COMMENT_CHUNK:
+                import_comments(records)
+                records = []
+        if records:
+            import_comments(records)
+        return count
+
+    def tree(self, post_id, pub_date, size, first_id, names, max_depth):
+        """Записи import_comments для одного поста.
+
+        Комментарий открывает новую ветку, отвечает на предыдущий
+        (ветки уходят вглубь) или на любой из ранних (ветки ветвятся).
+        """
+        parents, depths = [], []
+        span = self.now - pub_date
+        for node in range(size):
+            kind = self.rnd.random()
+            if not node or kind < ROOT_SHARE:
+                parent = None
+            elif kind < ROOT_SHARE + CHAIN_SHARE:
+                parent = node - 1
+            else:
+                parent = self.rnd.randrange(node)
+            while parent is not None and depths[parent] >= max_depth:
+                parent = parents[parent]
+            parents.append(parent)
+            depths.append(0 if parent is None else depths[parent] + 1)
+            yield {
+                "id": first_id + node,
+                "parent_id": None if parent is None else first_id + parent,
+                "post_id": post_id,
+                "author": self.rnd.choice(names),
+                "text": words(self.rnd, 3, 30),
+                "created": pub_date + span * ((node + 1) / (size + 1)),
+            }
+
+    def run(self, counts, image_share=0.2, max_depth=40):
+        """Создаёт строки по counts (см. scale), отдаёт (шаг, строк)."""
+        steps = (
+            ("users", self.add_users, [counts["users"]]),
+            ("groups", self.add_groups, [counts["groups"]]),
+            ("posts", self.add_posts, [counts["posts"], image_share]),
+            ("follows", self.add_follows, [counts["follows"]]),
+            ("timeline", self.fill_timeline, []),
+            ("comments", self.add_comments, [counts["comments"], max_depth]),
+        )
+        for name, step, args in steps:
+            with transaction.atomic():
+                created = step(*args)
+            yield name, created
+        # счётчики и поколения лент в кэше не знают о новых строках
+        cache.clear()
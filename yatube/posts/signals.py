@@ -0,0 +1,127 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .caching import (
+    bump_comments_version,
+    bump_feed_generations,
+    feed_scopes,
+)
+from .counting import forget_counts, post_scopes
+from .models import Comment, Follow, Post
+from .timeline import follow, push_post, unfollow
+
+
+def deleted_with_post(comment):
+    # каскад от удаления поста: пост и ветки исчезают целиком,
+    # а его ленты сбрасывает post_deleted
+    return getattr(comment, "_deleted_with_post", False)
+
+
+@receiver(pre_delete, sender=Comment)
+def comment_deleting(sender, instance, **kwargs):
+    if deleted_with_post(instance):
+        return
+    instance.refresh_from_db(fields=["path", "descendant_count"])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    """Вычитает удалённую ветку из счётчиков предков и поста.
+
+    Ответы удалённого комментария (parent = NULL) становятся корнями,
+    поэтому их пути перестраиваются от собственного сегмента.
+    """
+    if deleted_with_post(instance):
+        return
+    instance._change_counts(-1)
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F("comment_count") - 1
+    )
+    Comment.objects.filter(
+        post_id=instance.post_id, path__startswith=instance.path
+    ).update(path=Substr("path", len(instance.path) + 1))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comments_changed(sender, instance, **kwargs):
+    # повторно после коммита: фрагмент, собранный конкурентным запросом
+    # до коммита, не должен пережить изменение
+    if deleted_with_post(instance):
+        return
+    bump_comments_version(instance.post_id)
+    transaction.on_commit(lambda: bump_comments_version(instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_count_changed(sender, instance, created=True, **kwargs):
+    # ленты показывают comment_count поста; post_delete без created
+    if not created or deleted_with_post(instance):
+        return
+    post = (
+        Post.objects.filter(pk=instance.post_id)
+        .values_list("author_id", "group_id")
+        .first()
+    )
+    if post is not None:
+        bump_feeds_now_and_on_commit(feed_scopes(*post))
+
+
+def forget_counts_now_and_on_commit(scopes):
+    forget_counts(scopes)
+    transaction.on_commit(lambda: forget_counts(scopes))
+
+
+def bump_feeds_now_and_on_commit(scopes):
+    bump_feed_generations(scopes)
+    transaction.on_commit(lambda: bump_feed_generations(scopes))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    """Сбрасывает кэш лент поста и их число постов при смене группы."""
+    if created:
+        push_post(instance)
+    bump_feeds_now_and_on_commit(
+        feed_scopes(
+            instance.author_id, instance.group_id, instance._saved_group_id
+        )
+    )
+    if created or instance.group_id != instance._saved_group_id:
+        forget_counts_now_and_on_commit(
+            post_scopes(
+                instance.author_id, instance.group_id, instance._saved_group_id
+            )
+        )
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_feeds_now_and_on_commit(
+        feed_scopes(instance.author_id, instance.group_id)
+    )
+    forget_counts_now_and_on_commit(
+        post_scopes(instance.author_id, instance.group_id)
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    forget_counts_now_and_on_commit([f"follow:{instance.user_id}"])
+
+
+@receiver(post_save, sender=Follow)
+def followed(sender, instance, created, **kwargs):
+    if created:
+        follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def unfollowed(sender, instance, **kwargs):
+    unfollow(instance.user_id, instance.author_id)
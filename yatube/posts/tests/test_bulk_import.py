@@ -0,0 +1,155 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..bulk_import import import_comments
+from ..models import Comment, Post, path_step
+
+User = get_user_model()
+
+
+class BulkImportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.post = Post.objects.create(text="tt", author=cls.user)
+
+    def record(self, source_id, parent_id=None, **fields):
+        return {
+            "id": source_id,
+            "parent_id": parent_id,
+            "post_id": self.post.id,
+            "author": self.user.username,
+            "text": f"импорт {source_id}",
+            **fields,
+        }
+
+    def assertTreeValid(self):
+        """Поля дерева после импорта совпадают с полным rebuild MPTT."""
+        fields = ("id", "tree_id", "lft", "rght", "level", "path")
+        imported = list(Comment.objects.order_by("id").values_list(*fields))
+        Comment.objects.rebuild()
+        self.assertEqual(
+            imported,
+            list(Comment.objects.order_by("id").values_list(*fields)),
+        )
+
+    def test_import_builds_tree_fields(self):
+        """Импорт считает поля дерева, пути и счётчики без rebuild."""
+        ids = import_comments(
+            [
+                self.record(1),
+                self.record(2, 1),
+                self.record(3, 2),
+                self.record(4, 1),
+                self.record(5),
+            ]
+        )
+        root = Comment.objects.get(pk=ids[1])
+        grandchild = Comment.objects.get(pk=ids[3])
+        self.assertEqual(
+            (root.reply_count, root.descendant_count), (2, 3)
+        )
+        self.assertEqual(grandchild.level, 2)
+        self.assertEqual(
+            grandchild.path,
+            path_step(ids[1]) + path_step(ids[2]) + path_step(ids[3]),
+        )
+        self.assertEqual(
+            list(root.get_descendants().values_list("id", flat=True)),
+            [ids[2], ids[3], ids[4]],
+        )
+        self.assertTreeValid()
+
+    def test_import_into_existing_thread(self):
+        """reply_to прицепляет ветку к существующему комментарию."""
+        root = Comment.objects.create(
+            post=self.post, author=self.user, text="корень"
+        )
+        Comment.objects.create(
+            post=self.post, author=self.user, text="tt", parent=root
+        )
+        ids = import_comments(
+            [self.record(1, reply_to=root.id), self.record(2, 1)]
+        )
+        root.refresh_from_db()
+        self.assertEqual(
+            (root.reply_count, root.descendant_count), (2, 3)
+        )
+        self.assertEqual(Comment.objects.get(pk=ids[2]).ancestor_ids(),
+                         [root.id, ids[1]])
+        self.assertTreeValid()
+
+    def test_broken_parents_are_rejected(self):
+        """Циклы и родители вне импорта отклоняются до вставки."""
+        for records in (
+            [self.record(1), self.record(2, 3), self.record(3, 2)],
+            [self.record(1), self.record(2, 99)],
+        ):
+            with self.subTest(records=records):
+                with self.assertRaises(ValueError):
+                    import_comments(records)
+                self.assertFalse(Comment.objects.exists())
+                self.post.refresh_from_db()
+                self.assertEqual(self.post.comment_count, 0)
+
+    def test_bad_reply_targets_are_rejected(self):
+        """reply_to на чужой или несуществующий комментарий и родитель
+        из другого поста отклоняются до вставки."""
+        other = Post.objects.create(text="другой", author=self.user)
+        foreign = Comment.objects.create(
+            post=other, author=self.user, text="чужой"
+        )
+        for records in (
+            [self.record(1, reply_to=10 ** 9)],
+            [self.record(1, reply_to=foreign.id)],
+            [self.record(1), self.record(2, 1, post_id=other.id)],
+        ):
+            with self.subTest(records=records):
+                with self.assertRaises(ValueError):
+                    import_comments(records)
+                self.assertEqual(Comment.objects.count(), 1)
+                self.post.refresh_from_db()
+                self.assertEqual(self.post.comment_count, 0)
+
+    def test_import_keeps_created_and_creates_authors(self):
+        """Дата создания сохраняется, неизвестные авторы создаются."""
+        ids = import_comments(
+            [
+                self.record(
+                    1, author="newcomer", created="2020-01-02T03:04:05+00:00"
+                )
+            ]
+        )
+        comment = Comment.objects.get(pk=ids[1])
+        self.assertEqual(comment.author.username, "newcomer")
+        self.assertEqual(comment.created.year, 2020)
+
+    def test_export_import_roundtrip(self):
+        """NDJSON export_comments загружается командой import_comments."""
+        root = Comment.objects.create(
+            post=self.post, author=self.user, text="корень"
+        )
+        Comment.objects.create(
+            post=self.post, author=self.user, text="ответ", parent=root
+        )
+        out = StringIO()
+        call_command("export_comments", stdout=out)
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as dump:
+            dump.write(out.getvalue())
+            dump.flush()
+            call_command("import_comments", dump.name, stdout=StringIO())
+        copies = Comment.objects.exclude(pk__lte=root.pk + 1)
+        self.assertEqual(
+            [(c.text, c.level) for c in copies.order_by("path")],
+            [("корень", 0), ("ответ", 1)],
+        )
+        self.assertTreeValid()
+        self.assertEqual(
+            json.loads(out.getvalue().splitlines()[0])["text"], "корень"
+        )
@@ -0,0 +1,491 @@
+import base64
+import json
+import re
+import sys
+from http import HTTPStatus
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..caching import comment_cache_stats
+from ..comment_tree import MPTTTree, PathTree
+from ..models import Comment, Follow, Post, path_step
+from ..tree_html import CLOSE, render_thread
+from ..views import COMMENT_NUMBER
+
+User = get_user_model()
+
+
+class CommentTreeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.post = Post.objects.create(text="tt", author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, tree, parent=None, text="tt"):
+        return tree.insert(
+            Comment(post=self.post, author=self.user, text=text, parent=parent)
+        )
+
+    def build(self, tree):
+        root = self.add(tree)
+        child = self.add(tree, root)
+        grandchild = self.add(tree, child)
+        sibling = self.add(tree, root)
+        return root, child, grandchild, sibling
+
+    def test_path_is_built_from_parent(self):
+        """Путь ответа продолжает путь родителя."""
+        root = self.add(MPTTTree())
+        child = self.add(MPTTTree(), root)
+        self.assertEqual(root.path, path_step(root.pk))
+        self.assertEqual(child.path, root.path + path_step(child.pk))
+
+    def test_path_insert_touches_constant_rows(self):
+        """Вставка ответа в path-дерево не зависит от размера ветки."""
+        tree = PathTree()
+        root = self.add(tree)
+        with CaptureQueriesContext(connection) as first:
+            self.add(tree, root)
+        for _ in range(5):
+            self.add(tree, root)
+        with self.assertNumQueries(len(first)):
+            self.add(tree, root)
+        self.assertFalse(
+            any(
+                query["sql"].startswith("UPDATE") and "lft" in query["sql"]
+                for query in first.captured_queries
+            )
+        )
+
+    def test_backends_agree(self):
+        """Оба бэкенда возвращают одинаковых предков и потомков."""
+        for tree in (MPTTTree(), PathTree()):
+            with self.subTest(backend=tree.name):
+                root, child, grandchild, sibling = self.build(tree)
+                self.assertEqual(
+                    list(tree.ancestors(grandchild)), [root, child]
+                )
+                self.assertEqual(
+                    list(tree.descendants(root)), [child, grandchild, sibling]
+                )
+                self.assertEqual(
+                    [c for c in tree.subtree(self.post) if c.tree_id
+                     == root.tree_id],
+                    [root, child, grandchild, sibling],
+                )
+
+    @override_settings(COMMENT_TREE_BACKEND="path")
+    def test_post_detail_with_path_backend(self):
+        """Страница поста строит дерево по материализованному пути."""
+        client = Client()
+        client.force_login(self.user)
+        client.post(
+            f"/posts/{self.post.id}/comment/", {"text": "корень"}
+        )
+        root = Comment.objects.get(text="корень")
+        client.post(
+            f"/posts/{self.post.id}/comment/",
+            {"text": "дочерний", "comment_id": root.id},
+        )
+        reply = Comment.objects.get(text="дочерний")
+        self.assertTrue(reply.path.startswith(root.path))
+        self.assertEqual(reply.level, 1)
+        response = client.get(f"/posts/{self.post.id}/")
+        self.assertContains(response, "корень")
+        self.assertNotContains(response, "дочерний")
+        response = client.get(
+            f"/posts/{self.post.id}/comments/{root.id}/children/"
+        )
+        self.assertContains(response, "дочерний")
+
+    def test_reply_parent_is_validated(self):
+        """Ответ на чужой, несуществующий или нечисловой id - 404."""
+        client = Client()
+        client.force_login(self.user)
+        other = Post.objects.create(text="другой", author=self.user)
+        foreign = Comment.objects.create(
+            post=other, author=self.user, text="чужой"
+        )
+        for parent_id in (foreign.id, 10 ** 9, "abc"):
+            with self.subTest(parent_id=parent_id):
+                response = client.post(
+                    f"/posts/{self.post.id}/comment/",
+                    {"text": "ответ", "comment_id": parent_id},
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = client.post(
+            f"/posts/{self.post.id}/{foreign.id}/comment/", {"text": "ответ"}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertFalse(Comment.objects.filter(text="ответ").exists())
+        other.refresh_from_db()
+        self.assertEqual(other.comment_count, 1)
+
+
+@override_settings(COMMENT_TREE_BACKEND="mptt")
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.post = Post.objects.create(text="tt", author=cls.user)
+        cls.roots = [
+            Comment.objects.create(post=cls.post, author=cls.user, text=i)
+            for i in range(COMMENT_NUMBER + 5)
+        ]
+        cls.replies = [
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=i, parent=cls.roots[0]
+            )
+            for i in range(COMMENT_NUMBER + 1)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_renders_first_roots(self):
+        """Страница поста выводит первую страницу веток и ссылку "ещё"."""
+        response = Client().get(f"/posts/{self.post.id}/")
+        for comment in self.roots[:COMMENT_NUMBER]:
+            self.assertContains(response, f'id="comment{comment.id}"')
+        self.assertNotContains(response, f'id="comment{self.roots[-1].id}"')
+        self.assertContains(response, "Показать ещё")
+
+    def test_single_comment_form(self):
+        """На странице одна форма комментария, как бы ни было веток."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(f"/posts/{self.post.id}/")
+        self.assertContains(response, "<textarea", count=1)
+        self.assertContains(response, "csrfmiddlewaretoken", count=1)
+        self.assertContains(
+            response, f'data-reply-to="{self.roots[0].id}"', count=1
+        )
+
+    def test_thread_renders_nested_branch(self):
+        """Ветка целиком приходит одним фрагментом с вложенностью."""
+        root = Comment.objects.create(
+            post=self.post, author=self.user, text="root"
+        )
+        first, second = [
+            Comment.objects.create(
+                post=self.post, author=self.user, text=text, parent=root
+            )
+            for text in ("first", "second")
+        ]
+        deep = Comment.objects.create(
+            post=self.post, author=self.user, text="deep", parent=first
+        )
+        url = reverse("posts:comment_thread", args=(self.post.id, root.id))
+        html = Client().get(url).content.decode()
+        self.assertEqual(
+            re.findall(r'id="comment\d+"|</ul></div>', html),
+            [
+                f'id="comment{first.id}"',
+                f'id="comment{deep.id}"',
+                CLOSE,
+                CLOSE,
+                f'id="comment{second.id}"',
+                CLOSE,
+            ],
+        )
+
+    def test_render_thread_is_not_recursive(self):
+        """Глубина ветки не упирается в предел рекурсии."""
+        depth = sys.getrecursionlimit() * 2
+        chain = [
+            Comment(
+                id=i + 1, parent_id=i or None, author=self.user, text="tt"
+            )
+            for i in range(depth)
+        ]
+        html = render_thread(chain)
+        self.assertEqual(html.count('<div id="comment'), depth)
+        self.assertTrue(html.endswith(CLOSE * depth))
+
+    def test_roots_cursor_continues_page(self):
+        """Курсор продолжает список корней с места остановки."""
+        url = reverse("posts:comment_roots", args=(self.post.id,))
+        first = Client().get(url, {"format": "json"}).json()
+        second = Client().get(
+            url, {"format": "json", "cursor": first["next_cursor"]}
+        ).json()
+        ids = [c["id"] for c in first["comments"] + second["comments"]]
+        self.assertEqual(ids, [c.id for c in self.roots])
+        self.assertIsNone(second["next_cursor"])
+
+    def test_tampered_cursor_is_first_page(self):
+        """Курсор с чужими значениями ключа открывает первую страницу."""
+        roots = reverse("posts:comment_roots", args=(self.post.id,))
+        children = reverse(
+            "posts:comment_children", args=(self.post.id, self.roots[0].id)
+        )
+        first = Client().get(roots, {"format": "json"}).json()
+        for values in (
+            ["x"], [None], [{}], [1e999], ["bad-date", 1], [None, None],
+            [{}, []], [10 ** 30, 1], "[1, 2]", ["2022-13-45", "x"],
+        ):
+            raw = json.dumps({"order": "tree_id,lft", "key": values}).encode()
+            cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+            for url in (roots, children, f"/posts/{self.post.id}/"):
+                with self.subTest(values=values, url=url):
+                    response = Client().get(url, {"cursor": cursor})
+                    self.assertEqual(response.status_code, 200)
+            data = Client().get(
+                roots, {"format": "json", "sort": "newest", "cursor": cursor}
+            )
+            self.assertEqual(data.status_code, 200)
+            data = Client().get(roots, {"format": "json", "cursor": cursor})
+            self.assertEqual(data.json(), first)
+
+    def test_children_page(self):
+        """Ответы на комментарий отдаются страницами."""
+        url = reverse(
+            "posts:comment_children", args=(self.post.id, self.roots[0].id)
+        )
+        response = Client().get(url)
+        self.assertTemplateUsed(response, "includes/comment_list.html")
+        self.assertContains(response, f'id="comment{self.replies[0].id}"')
+        first = Client().get(url, {"format": "json"}).json()
+        data = Client().get(
+            url, {"format": "json", "cursor": first["next_cursor"]}
+        ).json()
+        self.assertEqual(data["comments"][0]["id"], self.replies[-1].id)
+        self.assertEqual(data["comments"][0]["level"], 1)
+
+    def test_root_sort_modes(self):
+        """Корни сортируются по новизне и по числу ответов."""
+        url = reverse("posts:comment_roots", args=(self.post.id,))
+        newest = Client().get(url, {"format": "json", "sort": "newest"})
+        self.assertEqual(
+            [c["id"] for c in newest.json()["comments"]],
+            [c.id for c in self.roots[::-1][:COMMENT_NUMBER]],
+        )
+        replies = Client().get(url, {"format": "json", "sort": "replies"})
+        self.assertEqual(
+            replies.json()["comments"][0]["id"], self.roots[0].id
+        )
+
+    def test_sorted_pages_do_not_overlap(self):
+        """Курсор сортировки newest продолжает ту же сортировку."""
+        url = reverse("posts:comment_roots", args=(self.post.id,))
+        first = Client().get(url, {"format": "json", "sort": "newest"}).json()
+        second = Client().get(
+            url,
+            {"format": "json", "sort": "newest",
+             "cursor": first["next_cursor"]},
+        ).json()
+        ids = [c["id"] for c in first["comments"] + second["comments"]]
+        self.assertEqual(ids, [c.id for c in self.roots[::-1]])
+
+    def test_cursor_of_other_sort_is_ignored(self):
+        """Курсор одной сортировки в другой открывает её первую страницу."""
+        url = reverse("posts:comment_roots", args=(self.post.id,))
+        newest = Client().get(url, {"format": "json", "sort": "newest"})
+        first = Client().get(url, {"format": "json"}).json()
+        for sort in ("oldest", "replies", ""):
+            with self.subTest(sort=sort):
+                data = Client().get(
+                    url,
+                    {"format": "json", "sort": sort,
+                     "cursor": newest.json()["next_cursor"]},
+                )
+                self.assertEqual(data.status_code, 200)
+                expected = Client().get(url, {"format": "json", "sort": sort})
+                self.assertEqual(data.json(), expected.json())
+        self.assertEqual(
+            Client().get(url, {"format": "json", "sort": "nope"}).json(),
+            first,
+        )
+
+    def test_jump_to_comment(self):
+        """?comment= открывает страницу, начинающуюся с ветки ответа."""
+        url = reverse("posts:comment_roots", args=(self.post.id,))
+        target = self.roots[-2]
+        reply = Comment.objects.create(
+            post=self.post, author=self.user, text="tt", parent=target
+        )
+        data = Client().get(url, {"format": "json", "comment": reply.id})
+        self.assertEqual(data.json()["comments"][0]["id"], target.id)
+        response = Client().get(
+            f"/posts/{self.post.id}/", {"comment": reply.id}
+        )
+        self.assertContains(response, f'id="comment{target.id}"')
+        self.assertNotContains(response, f'id="comment{self.roots[0].id}"')
+
+    def test_comment_tree_is_cached(self):
+        """Повторный показ ветки не обращается к дереву комментариев."""
+        url = f"/posts/{self.post.id}/"
+        # вошедшему пользователю страница не отдаётся из кэша целиком
+        client = Client()
+        client.force_login(self.user)
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertFalse(
+            any("posts_comment" in q["sql"] for q in queries.captured_queries)
+        )
+        self.assertContains(response, f'id="comment{self.roots[0].id}"')
+        stats = comment_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_new_comment_invalidates_cache(self):
+        """Новый ответ сбрасывает закэшированную ветку."""
+        url = reverse(
+            "posts:comment_children", args=(self.post.id, self.roots[1].id)
+        )
+        self.assertNotContains(Client().get(url), "свежий")
+        Comment.objects.create(
+            post=self.post, author=self.user, text="свежий",
+            parent=self.roots[1],
+        )
+        self.assertContains(Client().get(url), "свежий")
+
+
+class CommentCountsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.post = Post.objects.create(text="tt", author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.root = self.add()
+        self.child = self.add(self.root)
+        self.grandchild = self.add(self.child)
+        self.other = self.add()
+
+    def add(self, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.user, text="tt", parent=parent
+        )
+
+    def assertCounts(self, comment, replies, descendants):
+        comment.refresh_from_db()
+        self.assertEqual(
+            (comment.reply_count, comment.descendant_count),
+            (replies, descendants),
+        )
+
+    def test_counts_on_reply(self):
+        """Ответ увеличивает счётчики родителя и всех предков."""
+        self.assertCounts(self.root, 1, 2)
+        self.assertCounts(self.child, 1, 1)
+        self.assertCounts(self.grandchild, 0, 0)
+
+    def test_counts_on_delete(self):
+        """Удаление вычитает всю ветку из счётчиков предков."""
+        Comment.objects.get(pk=self.child.pk).delete()
+        self.assertCounts(self.root, 0, 0)
+        self.grandchild.refresh_from_db()
+        self.assertIsNone(self.grandchild.parent_id)
+        self.assertEqual(self.grandchild.ancestor_ids(), [])
+
+    def test_counts_on_move(self):
+        """Перенос ветки переносит её счётчики и пути."""
+        self.child.parent = self.other
+        self.child.save()
+        self.assertCounts(self.root, 0, 0)
+        self.assertCounts(self.other, 1, 2)
+        self.grandchild.refresh_from_db()
+        self.assertEqual(
+            self.grandchild.ancestor_ids(), [self.other.pk, self.child.pk]
+        )
+
+    def test_recount_command(self):
+        """recount_comments исправляет разъехавшиеся счётчики."""
+        Comment.objects.update(reply_count=7, descendant_count=7)
+        call_command("recount_comments", stdout=StringIO())
+        self.assertCounts(self.root, 1, 2)
+        self.assertCounts(self.other, 0, 0)
+
+    def test_post_comment_count(self):
+        """comment_count поста следует за добавлением и удалением."""
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 4)
+        Comment.objects.get(pk=self.child.pk).delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+
+    def test_post_delete_query_count_is_constant(self):
+        """Удаление поста не обходит его комментарии по одному."""
+        queries = []
+        for size in (3, 30):
+            post = Post.objects.create(text="tt", author=self.user)
+            parent = None
+            for _ in range(size):
+                parent = Comment.objects.create(
+                    post=post, author=self.user, text="tt", parent=parent
+                )
+            with CaptureQueriesContext(connection) as captured:
+                post.delete()
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertCounts(self.root, 1, 2)
+
+    def test_user_delete_keeps_other_counts(self):
+        """Комментарии автора под чужим постом вычитаются из счётчиков."""
+        guest = User.objects.create_user(username="guest")
+        Post.objects.create(text="tt", author=guest)
+        Comment.objects.create(
+            post=self.post, author=guest, text="tt", parent=self.grandchild
+        )
+        guest.delete()
+        self.assertCounts(self.root, 1, 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 4)
+
+    def test_recount_command_fixes_post_count(self):
+        """recount_comments исправляет comment_count поста."""
+        Post.objects.update(comment_count=9)
+        call_command("recount_comments", stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 4)
+
+    def test_feed_query_count_is_constant(self):
+        """Ленты не считают комментарии каждого поста отдельным запросом."""
+        follower = User.objects.create_user(username="follower")
+        Follow.objects.create(user=follower, author=self.user)
+        client = Client()
+        client.force_login(follower)
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:profile", args=(self.user.username,)),
+            reverse("posts:follow_index"),
+        )
+        few = {}
+        # оба замера - промахи кэша лент и счётчиков
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url)
+            few[url] = len(queries)
+        for _ in range(5):
+            Post.objects.create(text="tt", author=self.user)
+        for url in urls:
+            cache.clear()
+            with self.assertNumQueries(few[url]):
+                client.get(url)
+
+    def test_post_detail_query_count_is_constant(self):
+        """Число запросов страницы поста не зависит от числа комментариев."""
+        client = Client()
+        with CaptureQueriesContext(connection) as few:
+            client.get(f"/posts/{self.post.id}/")
+        for _ in range(10):
+            self.add(self.add())
+        cache.clear()
+        with self.assertNumQueries(len(few)):
+            client.get(f"/posts/{self.post.id}/")
@@ -0,0 +1,133 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..counting import ELLIPSIS, FeedPaginator, count_key, post_count
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+def count_queries(queries):
+    return sum("COUNT(" in query["sql"] for query in queries)
+
+
+class PostCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.group = Group.objects.create(slug="test-slug")
+
+    def setUp(self):
+        cache.clear()
+        for i in range(25):
+            Post.objects.create(
+                text=str(i), author=self.user, group=self.group
+            )
+        self.client = Client()
+
+    def test_count_is_cached(self):
+        """Повторная страница ленты не считает посты заново."""
+        for url in ("/", "/group/test-slug/", "/profile/HasNoName/"):
+            with self.subTest(url=url):
+                self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url + "?page=2")
+                self.assertEqual(count_queries(queries), 0)
+                self.assertEqual(
+                    response.context["page_obj"].paginator.count, 25
+                )
+
+    def test_profile_counts_once(self):
+        """Профиль берёт число постов из того же кэша, что и пагинатор."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/profile/HasNoName/")
+        self.assertEqual(count_queries(queries), 1)
+        self.assertEqual(response.context["count"], 25)
+
+    def test_create_and_delete_invalidate(self):
+        """Новый и удалённый пост меняют число в своих лентах."""
+        scope = f"group:{self.group.pk}"
+        self.assertEqual(post_count("all", Post.objects.all()), 25)
+        self.assertEqual(post_count(scope, self.group.posts.all()), 25)
+        Post.objects.create(text="new", author=self.user, group=self.group)
+        self.assertEqual(post_count("all", Post.objects.all()), 26)
+        self.assertEqual(post_count(scope, self.group.posts.all()), 26)
+        Post.objects.filter(text="new").delete()
+        self.assertEqual(post_count("all", Post.objects.all()), 25)
+
+    def test_group_change_invalidates_both_groups(self):
+        """Смена группы сбрасывает число постов старой и новой группы."""
+        other = Group.objects.create(slug="other")
+        old_scope, new_scope = f"group:{self.group.pk}", f"group:{other.pk}"
+        self.assertEqual(post_count(old_scope, self.group.posts.all()), 25)
+        self.assertEqual(post_count(new_scope, other.posts.all()), 0)
+        post = Post.objects.first()
+        post.group = other
+        post.save()
+        self.assertEqual(post_count(old_scope, self.group.posts.all()), 24)
+        self.assertEqual(post_count(new_scope, other.posts.all()), 1)
+
+    def test_follow_feed_invalidates(self):
+        """Подписка и новый пост автора меняют число постов подписок."""
+        follower = User.objects.create_user(username="follower")
+        scope = f"follow:{follower.pk}"
+        feed = Post.objects.filter(author__following__user=follower)
+        self.assertEqual(post_count(scope, feed), 0)
+        Follow.objects.create(user=follower, author=self.user)
+        self.assertEqual(post_count(scope, feed), 25)
+        Post.objects.create(text="new", author=self.user)
+        self.assertEqual(post_count(scope, feed), 26)
+
+    def test_low_count_does_not_hide_posts(self):
+        """Заниженное число постов не обрезает страницы ленты."""
+        cache.set(count_key("all"), 15)
+        page = self.client.get("/?page=2").context["page_obj"]
+        self.assertEqual(len(page), 10)
+        self.assertTrue(page.has_next())
+        page = self.client.get("/?page=3").context["page_obj"]
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_next())
+
+    def test_high_count_falls_back_to_first_page(self):
+        """Страница за концом ленты по завышенному числу - первая."""
+        cache.set(count_key("all"), 100)
+        page = self.client.get("/?page=10").context["page_obj"]
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), 10)
+
+    @override_settings(POST_COUNT_ESTIMATE=True)
+    def test_estimate_from_table_statistics(self):
+        """После ANALYZE вся лента считается по статистике таблицы."""
+        if connection.vendor != "sqlite":
+            self.skipTest("статистика sqlite_stat1")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        Post.objects.create(text="new", author=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            count = post_count("all", Post.objects.all())
+        self.assertEqual(count_queries(queries), 0)
+        self.assertEqual(count, 25)
+
+
+class ElidedPageRangeTests(TestCase):
+    def page_range(self, pages, number):
+        paginator = FeedPaginator(list(range(pages)), 1, "test")
+        paginator.count = pages
+        return paginator.elided_page_range(number)
+
+    def test_short_range_is_not_elided(self):
+        self.assertEqual(self.page_range(5, 3), [1, 2, 3, 4, 5])
+
+    def test_window_around_current_page(self):
+        self.assertEqual(
+            self.page_range(50000, 10000),
+            [1, ELLIPSIS, 9998, 9999, 10000, 10001, 10002, ELLIPSIS, 50000],
+        )
+
+    def test_edges(self):
+        self.assertEqual(self.page_range(20, 1), [1, 2, 3, ELLIPSIS, 20])
+        self.assertEqual(self.page_range(20, 20), [1, ELLIPSIS, 18, 19, 20])
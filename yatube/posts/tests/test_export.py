@@ -0,0 +1,75 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class CommentExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.staff = User.objects.create_user(username="staff", is_staff=True)
+        cls.post = Post.objects.create(text="tt", author=cls.user)
+        cls.root = Comment.objects.create(
+            post=cls.post, author=cls.user, text="корень"
+        )
+        cls.other = Comment.objects.create(
+            post=cls.post, author=cls.user, text="другой"
+        )
+        cls.reply = Comment.objects.create(
+            post=cls.post, author=cls.user, text="ответ", parent=cls.root
+        )
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def read(self, response):
+        content = b"".join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_export_streams_tree_order(self):
+        """Выгрузка отдаёт NDJSON в порядке обхода дерева."""
+        response = self.staff_client.get(
+            f"/posts/{self.post.id}/comments/export/"
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = self.read(response)
+        self.assertEqual(
+            [line["id"] for line in lines],
+            [self.root.id, self.reply.id, self.other.id],
+        )
+        self.assertEqual(lines[1]["parent_id"], self.root.id)
+        self.assertEqual(lines[1]["level"], 1)
+        self.assertEqual(lines[1]["author"], "HasNoName")
+
+    def test_export_since_id(self):
+        """since_id выгружает только новые комментарии."""
+        response = self.staff_client.get(
+            f"/posts/{self.post.id}/comments/export/",
+            {"since_id": self.other.id},
+        )
+        self.assertEqual(
+            [line["id"] for line in self.read(response)], [self.reply.id]
+        )
+
+    def test_export_requires_staff(self):
+        """Выгрузка недоступна обычному пользователю."""
+        response = Client().get(f"/posts/{self.post.id}/comments/export/")
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_command(self):
+        """manage.py export_comments пишет те же строки."""
+        out = StringIO()
+        call_command("export_comments", since_id=self.root.id, stdout=out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [line["id"] for line in lines], [self.reply.id, self.other.id]
+        )
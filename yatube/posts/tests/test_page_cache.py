@@ -0,0 +1,172 @@
+import time
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+
+from ..checks import TIMEOUTS, check_cache_timeouts
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.group = Group.objects.create(slug="test-slug")
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text="text", author=self.user, group=self.group
+        )
+        self.urls = (
+            "/",
+            "/?page=2",
+            "/group/test-slug/",
+            "/profile/HasNoName/",
+            f"/posts/{self.post.id}/",
+        )
+        self.client = Client()
+
+    def test_repeat_is_served_from_cache(self):
+        """Повторный запрос анонима не рендерит шаблон."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertTrue(first.templates)
+                with CaptureQueriesContext(connection) as queries:
+                    second = self.client.get(url)
+                self.assertLessEqual(len(queries), 1)
+                self.assertFalse(second.templates)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_conditional_get(self):
+        """If-None-Match даёт 304 не больше чем за один запрос."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    revalidated = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response["ETag"]
+                    )
+                self.assertLessEqual(len(queries), 1)
+                self.assertEqual(
+                    revalidated.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertEqual(revalidated["ETag"], response["ETag"])
+
+    def test_edit_is_not_hidden_by_if_modified_since(self):
+        """Правка и комментарий не прячутся за If-Modified-Since."""
+        for url in self.urls:
+            self.client.get(url)
+        self.post.text = "edited"
+        self.post.save()
+        Comment.objects.create(post=self.post, author=self.user, text="tt")
+        since = http_date(time.time() + 3600)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertContains(response, "edited")
+                self.assertFalse(response.has_header("Last-Modified"))
+
+    def test_changes_update_etag(self):
+        """Новый пост, правка и комментарий меняют ETag своих страниц."""
+        etags = {url: self.client.get(url)["ETag"] for url in self.urls}
+        Comment.objects.create(post=self.post, author=self.user, text="tt")
+        self.post.text = "edited"
+        self.post.save()
+        Post.objects.create(text="new", author=self.user, group=self.group)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response["ETag"], etag)
+
+    def test_authorized_pages_are_not_cached(self):
+        """Страницы вошедшего пользователя не кэшируются целиком."""
+        self.client.force_login(self.user)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.client.get(url)
+                response = self.client.get(url)
+                self.assertTrue(response.templates)
+                self.assertFalse(response.has_header("ETag"))
+
+    def test_missing_pages_are_not_cached(self):
+        for url in ("/group/missing/", "/profile/missing/"):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertFalse(response.has_header("ETag"))
+
+
+class PostBodyCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.reader = User.objects.create_user(username="reader")
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(text="text", author=self.user)
+        self.url = f"/posts/{self.post.id}/"
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_body_is_shared_between_users(self):
+        """Тело поста рендерится один раз, формы - каждому запросу."""
+        edit_url = f"/posts/{self.post.id}/edit/"
+        response = self.author_client.get(self.url)
+        self.assertTemplateUsed(response, "includes/post_body.html")
+        self.assertContains(response, edit_url)
+        response = self.reader_client.get(self.url)
+        self.assertTemplateNotUsed(response, "includes/post_body.html")
+        self.assertContains(response, "text")
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertNotContains(response, edit_url)
+
+    def test_edit_refreshes_body(self):
+        self.reader_client.get(self.url)
+        self.post.text = "edited"
+        self.post.save()
+        self.assertContains(self.reader_client.get(self.url), "edited")
+
+
+class CacheSettingsCheckTests(TestCase):
+    LOCMEM = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+    SHARED = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+        }
+    }
+
+    def test_long_timeouts_need_shared_cache(self):
+        """Долгий кэш с кэшем процесса - ошибка проверки настроек."""
+        for name in TIMEOUTS:
+            with self.subTest(name=name):
+                with override_settings(CACHES=self.LOCMEM, **{name: 3600}):
+                    errors = check_cache_timeouts(None)
+                self.assertEqual(
+                    [error.id for error in errors], ["posts.E001"]
+                )
+                with override_settings(CACHES=self.SHARED, **{name: 3600}):
+                    self.assertEqual(check_cache_timeouts(None), [])
+
+    def test_default_settings_pass(self):
+        self.assertEqual(check_cache_timeouts(None), [])
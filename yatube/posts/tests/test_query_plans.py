@@ -0,0 +1,92 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# строка плана без индекса: полный проход по таблице (не подзапросу)
+FULL_SCAN = re.compile(r"SCAN (TABLE )?(?!subquery)\w+( AS \w+)?$")
+ALL_POSTS_COUNT = 'SELECT COUNT(*) AS "__count" FROM "posts_post"'
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN из SQLite")
+class QueryPlanTests(TestCase):
+    """Запросы страниц идут по индексам: без полных проходов и сортировок.
+
+    Число постов всей ленты (COUNT без условий) не проверяется: оно
+    кэшируется в counting и по смыслу читает весь индекс.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(slug="test-slug")
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for i in range(30):
+            Post.objects.create(
+                text=str(i),
+                author=cls.user,
+                group=cls.group if i % 2 else None,
+            )
+        cls.post = Post.objects.first()
+        for _ in range(5):
+            root = Comment.objects.create(
+                post=cls.post, author=cls.user, text="tt"
+            )
+            for _ in range(3):
+                Comment.objects.create(
+                    post=cls.post, author=cls.user, text="tt", parent=root
+                )
+        cls.root = root
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for query in queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or sql == ALL_POSTS_COUNT:
+                continue
+            for line in self.plan(sql):
+                with self.subTest(url=url, sql=sql, plan=line):
+                    self.assertNotIn("TEMP B-TREE", line)
+                    self.assertIsNone(FULL_SCAN.match(line))
+
+    def test_feed_pages(self):
+        for url in (
+            "/",
+            "/?page=2",
+            "/?cursor=",
+            f"/group/{self.group.slug}/",
+            f"/profile/{self.user.username}/",
+            "/follow/",
+            "/follow/?cursor=",
+        ):
+            self.assertIndexedPlans(url)
+
+    def test_comment_pages(self):
+        for url in (
+            f"/posts/{self.post.id}/",
+            f"/posts/{self.post.id}/comments/",
+            f"/posts/{self.post.id}/comments/{self.root.id}/children/",
+            f"/posts/{self.post.id}/comments/{self.root.id}/thread/",
+        ):
+            self.assertIndexedPlans(url)
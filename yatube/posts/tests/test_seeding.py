@@ -0,0 +1,123 @@
+import random
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, Sum
+from django.test import TestCase, override_settings
+from django.urls import resolve
+
+from ..management.commands.bench_load import (
+    Command as BenchLoad,
+    build_cases,
+    url_patterns,
+)
+from ..models import AuthorFeed, Comment, Follow, Post, TimelineEntry
+from ..seeding import scale
+from ..tree_repair import tree_violations
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+ROWS = 3000
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, FEED_PULL_THRESHOLD=10)
+class SeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.out = StringIO()
+        call_command("seed", rows=ROWS, image_share=0.5, stdout=cls.out)
+        cls.counts = scale(ROWS)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_rows(self):
+        """seed создаёт строки в долях --rows и печатает отчёт по шагам."""
+        self.assertEqual(
+            User.objects.filter(username__startswith="seed").count(),
+            self.counts["users"],
+        )
+        self.assertEqual(Post.objects.count(), self.counts["posts"])
+        self.assertEqual(Comment.objects.count(), self.counts["comments"])
+        self.assertTrue(Post.objects.exclude(image="").exists())
+        self.assertIn("comments\t", self.out.getvalue())
+
+    def test_popularity_is_skewed(self):
+        """Авторы первых рангов пишут и собирают больше остальных."""
+        posts = list(
+            Post.objects.values("author")
+            .annotate(n=Count("id"))
+            .order_by("-n")
+            .values_list("n", flat=True)
+        )
+        self.assertGreater(posts[0], 5 * posts[len(posts) // 2])
+        comments = list(
+            Post.objects.order_by("-comment_count").values_list(
+                "comment_count", flat=True
+            )
+        )
+        self.assertGreater(comments[0], 10 * comments[len(comments) // 2])
+
+    def test_comment_trees_are_valid(self):
+        """Деревья целые, глубокие, а счётчики постов сходятся."""
+        comments = list(Comment.objects.all())
+        self.assertFalse(+tree_violations(comments))
+        self.assertGreater(max(comment.level for comment in comments), 5)
+        self.assertEqual(
+            Post.objects.aggregate(n=Sum("comment_count"))["n"],
+            len(comments),
+        )
+
+    def test_feeds_match_follows(self):
+        """AuthorFeed и TimelineEntry такие, какими их сделали бы сигналы."""
+        followers = dict(
+            Follow.objects.values("author")
+            .annotate(n=Count("id"))
+            .values_list("author", "n")
+            .order_by()
+        )
+        feeds = {
+            feed.author_id: feed for feed in AuthorFeed.objects.all()
+        }
+        self.assertEqual(
+            {author: feed.followers for author, feed in feeds.items()},
+            followers,
+        )
+        self.assertTrue(any(feed.pulled for feed in feeds.values()))
+        expected = sum(
+            Post.objects.filter(author_id=author_id).count()
+            for author_id in Follow.objects.filter(
+                author__feed__pulled=False
+            ).values_list("author_id", flat=True)
+        )
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+
+    def test_prefix_is_not_reused(self):
+        with self.assertRaises(CommandError):
+            call_command("seed", rows=100, stdout=StringIO())
+
+    def test_bench_requests_every_url(self):
+        """bench_load строит запросы ко всем URL posts и users."""
+        cases = build_cases()
+        self.assertEqual(
+            {case.name for case in cases},
+            {name for name, _ in url_patterns()},
+        )
+        rnd = random.Random(0)
+        data = BenchLoad().sample_data(
+            rnd, {"sample": 50, "zipf": 1.1, "username": None}
+        )
+        for case in cases:
+            method, path, form = case.request(rnd, data)
+            self.assertEqual(
+                resolve(path).view_name, case.name, f"{case.key}: {path}"
+            )
+            self.assertEqual(form is None, method == "GET")
@@ -0,0 +1,170 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+
+from .. import timeline
+from ..keyset import encode_cursor
+from ..models import AuthorFeed, Follow, Post, TimelineEntry
+from ..timeline import TIMELINE_ORDER
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="HasNoName")
+        cls.other = User.objects.create_user(username="Another")
+        cls.reader = User.objects.create_user(username="reader")
+
+    def setUp(self):
+        cache.clear()
+        self.old = [
+            Post.objects.create(text=str(i), author=self.author)
+            for i in range(3)
+        ]
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self, url="/follow/"):
+        return list(self.client.get(url).context["page_obj"])
+
+    def test_follow_backfills_timeline(self):
+        """Подписка переносит в ленту прошлые посты автора."""
+        self.client.get(f"/profile/{self.author.username}/follow/")
+        self.assertEqual(self.feed(), self.old[::-1])
+
+    def test_new_post_fans_out_in_batches(self):
+        """Новый пост пишется в ленты подписчиков пачками."""
+        followers = [
+            User.objects.create_user(username=f"follower{i}")
+            for i in range(5)
+        ]
+        for user in followers + [self.reader]:
+            Follow.objects.create(user=user, author=self.author)
+        with mock.patch.object(timeline, "BATCH_SIZE", 2):
+            post = Post.objects.create(text="new", author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(post=post).count(), len(followers) + 1
+        )
+        self.assertEqual(self.feed()[0], post)
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает из ленты только посты этого автора."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        kept = Post.objects.create(text="other", author=self.other)
+        self.client.get(f"/profile/{self.author.username}/unfollow/")
+        self.assertEqual(self.feed(), [kept])
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.author).exists()
+        )
+
+    def test_cursor_pages_follow_timeline(self):
+        """Курсорные страницы ленты идут по полям TimelineEntry."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(text=str(i), author=self.author)
+            for i in range(12)
+        ]
+        first = self.client.get("/follow/?cursor=").context["page_obj"]
+        second = self.feed(f"/follow/?cursor={first.next_cursor}")
+        self.assertEqual(list(first) + second, posts[::-1] + self.old[::-1])
+
+    def test_feed_does_not_join_follow(self):
+        """Лента читается из TimelineEntry без соединения с Follow."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        query = str(timeline.timeline_posts(self.reader).query)
+        self.assertIn(TimelineEntry._meta.db_table, query)
+        self.assertNotIn(Follow._meta.db_table, query)
+
+
+@override_settings(FEED_PULL_THRESHOLD=4)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username="star")
+        cls.author = User.objects.create_user(username="HasNoName")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.fans = [
+            User.objects.create_user(username=f"fan{i}") for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow_star(self):
+        for user in self.fans + [self.reader]:
+            Follow.objects.create(user=user, author=self.star)
+
+    def feed(self, url="/follow/"):
+        return self.client.get(url).context["page_obj"]
+
+    def test_author_over_threshold_is_pulled(self):
+        """С порога подписчиков посты автора не раскладываются по лентам."""
+        Post.objects.create(text="old", author=self.star)
+        self.follow_star()
+        feed = AuthorFeed.objects.get(author=self.star)
+        self.assertEqual((feed.followers, feed.pulled), (4, True))
+        Post.objects.create(text="new", author=self.star)
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.star).exists()
+        )
+
+    def test_pulled_posts_are_merged_into_feed(self):
+        """Лента сливает посты pull-автора с разложенными постами."""
+        self.follow_star()
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(
+                text=str(i), author=self.star if i % 3 else self.author
+            )
+            for i in range(15)
+        ]
+        first = self.feed()
+        self.assertEqual(first.paginator.count, 15)
+        self.assertEqual(
+            list(first) + list(self.feed("/follow/?page=2")), posts[::-1]
+        )
+        first = self.feed("/follow/?cursor=")
+        second = self.feed(f"/follow/?cursor={first.next_cursor}")
+        self.assertEqual(list(first) + list(second), posts[::-1])
+        back = self.feed(f"/follow/?cursor={second.previous_cursor}")
+        self.assertEqual(list(back), list(first))
+
+    def test_tampered_cursor_on_merged_feed(self):
+        """Битый курсор ленты с pull-автором открывает первую страницу."""
+        self.follow_star()
+        Post.objects.create(text="star", author=self.star)
+        first = list(self.feed("/follow/?cursor="))
+        cursor = encode_cursor([">", "bad-date", 1], TIMELINE_ORDER)
+        self.assertEqual(list(self.feed(f"/follow/?cursor={cursor}")), first)
+
+    def test_author_below_half_threshold_is_pushed_again(self):
+        """Ниже половины порога автор снова раскладывается с подпиской."""
+        post = Post.objects.create(text="old", author=self.star)
+        self.follow_star()
+        Follow.objects.filter(user__in=self.fans[:2]).delete()
+        self.assertTrue(AuthorFeed.objects.get(author=self.star).pulled)
+        Follow.objects.filter(user=self.fans[2]).delete()
+        self.assertFalse(AuthorFeed.objects.get(author=self.star).pulled)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(list(self.feed()), [post])
+
+    def test_rebalance_command(self):
+        """rebalance_feeds пересчитывает подписчиков и режим авторов."""
+        self.follow_star()
+        AuthorFeed.objects.all().update(followers=0, pulled=False)
+        call_command("rebalance_feeds", stdout=StringIO())
+        feed = AuthorFeed.objects.get(author=self.star)
+        self.assertEqual((feed.followers, feed.pulled), (4, True))
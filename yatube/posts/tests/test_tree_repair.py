@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..comment_tree import PathTree
+from ..models import Comment, DirtyTree, Post
+from ..tree_repair import Checkpoint, check_trees, tree_violations
+
+User = get_user_model()
+FIELDS = ("id", "parent_id", "tree_id", "lft", "rght", "level", "path")
+
+
+class TreeRepairTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.post = Post.objects.create(text="tt", author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.root = self.add()
+        self.child = self.add(self.root)
+        self.grandchild = self.add(self.child)
+        self.sibling = self.add(self.root)
+        self.other = self.add()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, "trees.json")
+
+    def add(self, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.user, text="tt", parent=parent
+        )
+
+    def rows(self):
+        return list(Comment.objects.order_by("id").values_list(*FIELDS))
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command(
+            "check_comment_trees", "--checkpoint", self.checkpoint, *args,
+            stdout=out,
+        )
+        return dict(line.split("\t") for line in out.getvalue().splitlines())
+
+    def test_valid_trees_are_untouched(self):
+        """Целые деревья проверяются без записи в базу."""
+        before = self.rows()
+        metrics = self.run_command()
+        self.assertEqual(metrics["comment_tree_trees_checked"], "2")
+        self.assertEqual(metrics["comment_tree_trees_corrupted"], "0")
+        self.assertEqual(self.rows(), before)
+
+    def test_tree_violations(self):
+        """Нарушения nested set считаются по видам."""
+        self.assertFalse(+tree_violations(list(Comment.objects.all())))
+        Comment.objects.filter(pk=self.grandchild.pk).update(
+            lft=9, rght=10, level=1
+        )
+        violations = tree_violations(list(Comment.objects.all()))
+        self.assertEqual(
+            violations, {"gaps": 1, "level": 1, "containment": 1}
+        )
+
+    def test_drifted_fields_are_repaired(self):
+        """Разъехавшиеся lft/rght/level чинятся как при полном rebuild."""
+        expected = self.rows()
+        Comment.objects.filter(pk=self.child.pk).update(rght=9, level=7)
+        Comment.objects.filter(pk=self.root.pk).update(rght=2)
+        metrics = self.run_command()
+        self.assertEqual(metrics["comment_tree_trees_corrupted"], "1")
+        self.assertEqual(metrics["comment_tree_nodes_fixed"], "2")
+        self.assertEqual(self.rows(), expected)
+
+    def test_orphans_get_own_tree(self):
+        """Ответы удалённого комментария становятся отдельным деревом."""
+        Comment.objects.filter(pk=self.child.pk).delete()
+        metrics = self.run_command()
+        self.assertEqual(metrics["comment_tree_orphans"], "1")
+        self.grandchild.refresh_from_db()
+        self.assertNotEqual(self.grandchild.tree_id, self.root.tree_id)
+        self.assertEqual(
+            (self.grandchild.lft, self.grandchild.rght), (1, 2)
+        )
+        repaired = self.rows()
+        Comment.objects.rebuild()
+        self.assertEqual(
+            [row[:2] + row[3:] for row in repaired],
+            [row[:2] + row[3:] for row in self.rows()],
+        )
+
+    def test_stray_branch_moves_to_parent_tree(self):
+        """Ветка с tree_id чужого дерева возвращается к родителю."""
+        expected = self.rows()
+        Comment.objects.filter(pk=self.grandchild.pk).update(
+            tree_id=self.other.tree_id
+        )
+        metrics = self.run_command()
+        self.assertEqual(metrics["comment_tree_strays"], "1")
+        self.assertEqual(self.rows(), expected)
+
+    def test_check_only(self):
+        """--check-only считает повреждения, но не чинит их."""
+        Comment.objects.filter(pk=self.child.pk).update(lft=40)
+        metrics = self.run_command("--check-only")
+        self.assertEqual(metrics["comment_tree_trees_corrupted"], "1")
+        self.child.refresh_from_db()
+        self.assertEqual(self.child.lft, 40)
+
+    def test_budget_resumes_from_checkpoint(self):
+        """Исчерпав бюджет, проход продолжается с контрольной точки."""
+        checkpoint = Checkpoint(self.checkpoint)
+        self.assertEqual(check_trees(checkpoint, budget=0)["trees_checked"], 0)
+        checkpoint.tree_id = self.root.tree_id
+        checkpoint.save()
+        metrics = self.run_command()
+        self.assertEqual(metrics["comment_tree_trees_checked"], "1")
+        self.assertEqual(metrics["comment_tree_passes"], "1")
+        with open(self.checkpoint, encoding="utf-8") as state:
+            self.assertEqual(json.load(state)["tree_id"], 0)
+
+    def test_path_inserts_are_repaired_first(self):
+        """Дерево с ответами бэкенда path чинится вне очереди прохода."""
+        for _ in range(3):
+            PathTree().insert(
+                Comment(
+                    post=self.post, author=self.user, text="tt",
+                    parent=self.child,
+                )
+            )
+        self.assertTrue(tree_violations(list(Comment.objects.all())))
+        self.assertEqual(
+            list(DirtyTree.objects.values_list("tree_id", flat=True)),
+            [self.root.tree_id],
+        )
+        checkpoint = Checkpoint(self.checkpoint)
+        # проход уже за этим деревом: починить его может только отметка
+        checkpoint.tree_id = self.other.tree_id
+        check_trees(checkpoint)
+        self.assertFalse(+tree_violations(list(Comment.objects.all())))
+        self.assertFalse(DirtyTree.objects.exists())
+        for comment in Comment.objects.exclude(parent=None):
+            self.assertEqual(comment.get_ancestors()[0], self.root)
@@ -5,11 +5,14 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.shortcuts import get_object_or_404
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from posts.keyset import encode_cursor
 from posts.models import Follow, Group, Post
-from posts.views import POST_NUMBER
+from posts.views import POST_NUMBER, POST_ORDER
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -70,6 +73,7 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.guest_user = PostPagesTests.user
         self.guest_user2 = PostPagesTests.user2
@@ -193,11 +197,15 @@ class PostPagesTests(TestCase):
                 self.assertIn(
                     "page_obj", self.authorized_client.get(addres).context
                 )
+                # при попадании в кэш ленты шаблон не перебирает page_obj,
+                # и object_list остаётся QuerySet, а не списком
                 self.assertEqual(
                     list(posts),
-                    self.authorized_client.get(addres)
-                    .context["page_obj"]
-                    .object_list[0:POST_NUMBER],
+                    list(
+                        self.authorized_client.get(addres)
+                        .context["page_obj"]
+                        .object_list[0:POST_NUMBER]
+                    ),
                 )
 
     def test_post_exists_index_page(self):
@@ -219,17 +227,14 @@ class PostPagesTests(TestCase):
         self.assertNotIn(self.post65, response.context["page_obj"])
 
     def test_cache_works(self):
-        """Проверяем, что кэш работает на главной странице"""
-        response = self.authorized_client.get("/")
-        content = response.content
-        Post.objects.filter(id=67).delete()
-        response = self.authorized_client.get("/")
-        new_content = response.content
-        self.assertEqual(content, new_content)
+        """Главная страница из кэша, пока посты не меняются"""
         cache.clear()
-        response = self.authorized_client.get("/")
-        clear_content = response.content
-        self.assertNotEqual(content, clear_content)
+        content = self.authorized_client.get("/").content
+        # update минует сигналы Post: поколение ленты не меняется
+        Post.objects.filter(id=67).update(text="changed")
+        self.assertEqual(self.authorized_client.get("/").content, content)
+        Post.objects.filter(id=67).delete()
+        self.assertNotEqual(self.authorized_client.get("/").content, content)
 
 
 class FollowTests(TestCase):
@@ -242,6 +247,7 @@ class FollowTests(TestCase):
         cls.post = Post.objects.create(id=1, author=cls.user)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.guest_user = FollowTests.user
         self.guest_user2 = FollowTests.user2
@@ -285,6 +291,7 @@ class PaginatorViewsTest(TestCase):
         cls.group = Group.objects.create(slug="test-slug")
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.guest_user = PaginatorViewsTest.user
         self.authorized_client = Client()
@@ -325,3 +332,91 @@ class PaginatorViewsTest(TestCase):
             "/profile/HasNoName/" + "?page=2"
         )
         self.assertEqual(len(response.context["page_obj"]), PAGINATOR_TEST)
+
+    def test_keyset_pages_follow_cursors(self):
+        """Курсоры ведут вперёд и назад по той же ленте без COUNT."""
+        first = self.guest_client.get("/?cursor=").context["page_obj"]
+        self.assertEqual(len(first), POST_NUMBER)
+        self.assertFalse(first.has_previous())
+        with CaptureQueriesContext(connection) as queries:
+            second = self.guest_client.get(
+                f"/?cursor={first.next_cursor}"
+            ).context["page_obj"]
+        self.assertNotIn("COUNT", " ".join(q["sql"] for q in queries))
+        self.assertEqual(len(second), PAGINATOR_TEST)
+        self.assertFalse(second.has_next())
+        back = self.guest_client.get(
+            f"/?cursor={second.previous_cursor}"
+        ).context["page_obj"]
+        self.assertEqual(list(back), list(first))
+        self.assertEqual(
+            list(first) + list(second),
+            list(Post.objects.order_by("-pub_date", "-id")),
+        )
+
+    def test_tampered_keyset_cursor_is_first_page(self):
+        """Курсор с негодным ключом открывает первую страницу ленты."""
+        first = list(self.guest_client.get("/?cursor=").context["page_obj"])
+        for values in (
+            [">", "bad-date", 1], ["<", None, 1], [">", {}, []],
+            ["<", "2022-01-01T00:00:00", 1e999], [">", 1], ["?", 1, 2],
+        ):
+            cursor = encode_cursor(values, POST_ORDER)
+            for url in ("/", "/group/test-slug/", "/profile/HasNoName/"):
+                with self.subTest(values=values, url=url):
+                    response = self.guest_client.get(url, {"cursor": cursor})
+                    self.assertEqual(response.status_code, 200)
+            # страница того же адреса уже в кэше анонимных страниц
+            cache.clear()
+            page = self.guest_client.get("/", {"cursor": cursor})
+            self.assertEqual(list(page.context["page_obj"]), first)
+
+    @override_settings(POST_PAGINATION="keyset")
+    def test_keyset_setting_for_all_feeds(self):
+        """POST_PAGINATION = "keyset" переводит ленты на курсоры."""
+        Follow.objects.create(
+            user=User.objects.create_user(username="follower"),
+            author=self.user,
+        )
+        follower = Client()
+        follower.force_login(User.objects.get(username="follower"))
+        for client, url in (
+            (self.guest_client, "/"),
+            (self.guest_client, "/group/test-slug/"),
+            (self.guest_client, "/profile/HasNoName/"),
+            (follower, "/follow/"),
+        ):
+            with self.subTest(url=url):
+                page = client.get(url).context["page_obj"]
+                self.assertEqual(len(page), POST_NUMBER)
+                self.assertTrue(page.has_next())
+
+    def test_feed_cache_is_page_aware(self):
+        """Каждая страница ленты кэшируется отдельно."""
+        cache.clear()
+        for url in ("/", "/group/test-slug/", "/profile/HasNoName/"):
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                response = self.guest_client.get(url + "?page=2")
+                for post in response.context["page_obj"]:
+                    self.assertIn(
+                        f'href="/posts/{post.id}/"',
+                        "".join(response.context["posts_html"]),
+                    )
+
+    def test_feed_cache_follows_post_changes(self):
+        """Новый пост сразу виден в закэшированных лентах."""
+        cache.clear()
+        for url in ("/", "/group/test-slug/", "/profile/HasNoName/"):
+            self.guest_client.get(url)
+        post = Post.objects.create(
+            text="new",
+            author=PaginatorViewsTest.user,
+            group=PaginatorViewsTest.group,
+        )
+        for url in ("/", "/group/test-slug/", "/profile/HasNoName/"):
+            with self.subTest(url=url):
+                self.assertIn(
+                    f'href="/posts/{post.id}/"',
+                    "".join(self.guest_client.get(url).context["posts_html"]),
+                )
@@ -0,0 +1,212 @@
+"""Лента подписок: push для обычных авторов, pull для популярных.
+
+Пост обычного автора раскладывается в TimelineEntry каждого подписчика
+пачками bulk_create; подписка переносит в ленту прошлые посты автора,
+отписка их удаляет. Автора, у которого не меньше FEED_PULL_THRESHOLD
+подписчиков, лента читает сама при показе: выборки по индексу (author,
+pub_date, id) сливаются (k-way merge) с выборкой TimelineEntry. Режим
+автора хранится в AuthorFeed.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .counting import forget_counts, post_count
+from .models import AuthorFeed, Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+# порядок ленты по аннотациям feed_date, feed_post (timeline_posts)
+TIMELINE_ORDER = ("-feed_date", "-feed_post")
+
+
+def insert_batches(entries):
+    """bulk_create пачками по BATCH_SIZE без материализации всего списка."""
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def follower_ids(author_id):
+    return Follow.objects.filter(author_id=author_id).values_list(
+        "user_id", flat=True
+    )
+
+
+def author_pulled(author_id):
+    return AuthorFeed.objects.filter(
+        author_id=author_id, pulled=True
+    ).exists()
+
+
+def push_post(post):
+    """Добавляет новый пост в ленты подписчиков, если автор не pull."""
+    if author_pulled(post.author_id):
+        return
+    insert_batches(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in follower_ids(post.author_id).iterator()
+    )
+
+
+def backfill(author_id, user_ids):
+    """Переносит посты автора в ленты подписчиков user_ids."""
+    posts = list(
+        Post.objects.filter(author_id=author_id).values_list("id", "pub_date")
+    )
+    insert_batches(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for user_id in user_ids
+        for post_id, pub_date in posts
+    )
+
+
+def prune(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+
+
+def apply_threshold(feed):
+    """Сохраняет feed, переключая режим автора на границе порога.
+
+    Обратно в push автор возвращается, только опустившись ниже половины
+    порога, чтобы режим не переключался на каждой подписке у границы.
+    """
+    threshold = settings.FEED_PULL_THRESHOLD
+    if not feed.pulled and feed.followers >= threshold:
+        feed.pulled = True
+        TimelineEntry.objects.filter(author_id=feed.author_id).delete()
+    elif feed.pulled and feed.followers < threshold // 2:
+        feed.pulled = False
+        backfill(feed.author_id, follower_ids(feed.author_id).iterator())
+    else:
+        feed.save()
+        return
+    feed.save()
+    forget_counts(
+        [f"follow:{user_id}" for user_id in follower_ids(feed.author_id)]
+    )
+
+
+def count_follower(author_id, delta):
+    """Меняет число подписчиков автора; возвращает, pull ли автор."""
+    with transaction.atomic():
+        feed, _ = AuthorFeed.objects.select_for_update().get_or_create(
+            author_id=author_id
+        )
+        feed.followers = max(feed.followers + delta, 0)
+        apply_threshold(feed)
+    return feed.pulled
+
+
+def follow(user_id, author_id):
+    if not count_follower(author_id, 1):
+        backfill(author_id, [user_id])
+
+
+def unfollow(user_id, author_id):
+    count_follower(author_id, -1)
+    prune(user_id, author_id)
+
+
+class MergedFeed:
+    """Несколько упорядоченных выборок постов как одна выборка.
+
+    Поддерживает то, что нужно пагинаторам: order_by, filter,
+    select_related, срез и count. Срез [a:b] берёт до b постов из каждой
+    выборки и сливает их heapq.merge, поэтому все поля порядка должны
+    идти в одну сторону. parts - пары (область счётчика, queryset).
+    """
+
+    def __init__(self, parts, order=TIMELINE_ORDER):
+        self.parts = parts
+        self.order = tuple(order)
+
+    def apply(self, method, *args, **kwargs):
+        return [
+            (scope, getattr(queryset, method)(*args, **kwargs))
+            for scope, queryset in self.parts
+        ]
+
+    # модель и типы полей порядка для курсоров (keyset.clean_key): у
+    # частей они одинаковые
+    @property
+    def model(self):
+        return self.parts[0][1].model
+
+    @property
+    def query(self):
+        return self.parts[0][1].query
+
+    def order_by(self, *fields):
+        return MergedFeed(self.apply("order_by", *fields), fields)
+
+    def filter(self, *args, **kwargs):
+        return MergedFeed(self.apply("filter", *args, **kwargs), self.order)
+
+    def select_related(self, *fields):
+        return MergedFeed(self.apply("select_related", *fields), self.order)
+
+    def count(self):
+        return sum(
+            post_count(scope, queryset) for scope, queryset in self.parts
+        )
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        names = [name.lstrip("-") for name in self.order]
+        merged = heapq.merge(
+            *(queryset[:index.stop] for _, queryset in self.parts),
+            key=lambda post: [getattr(post, name) for name in names],
+            reverse=self.order[0].startswith("-"),
+        )
+        return list(islice(merged, index.start or 0, index.stop))
+
+
+def timeline_posts(user):
+    """Посты ленты подписок user; упорядочивать по TIMELINE_ORDER.
+
+    Без подписок на pull-авторов - queryset по TimelineEntry, иначе
+    MergedFeed из него и выборок постов каждого такого автора.
+    """
+    pushed = Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_date=F("timeline_entries__pub_date"),
+        feed_post=F("timeline_entries__post"),
+    )
+    pulled = list(
+        Follow.objects.filter(
+            user=user, author__feed__pulled=True
+        ).values_list("author_id", flat=True)
+    )
+    if not pulled:
+        return pushed
+    return MergedFeed(
+        [(f"follow:{user.pk}", pushed)]
+        + [
+            (
+                f"author:{author_id}",
+                Post.objects.filter(author_id=author_id).annotate(
+                    feed_date=F("pub_date"), feed_post=F("id")
+                ),
+            )
+            for author_id in pulled
+        ]
+    )
@@ -0,0 +1,51 @@
+"""Рендер ветки комментариев без рекурсии.
+
+Ветка читается одной выборкой в порядке обхода в глубину (tree.order) с
+select_related("author"). Вложенность восстанавливается за один проход
+стеком открытых узлов, HTML собирается списком строк: ни шаблонизатора
+на узел, ни рекурсии, поэтому глубина ветки ничем не ограничена.
+Разметка узла та же, что в includes/comment_list.html.
+"""
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+NODE = (
+    '<div id="comment{id}">'
+    '<h3 class="mt-0"><a href="{profile}">{author}</a></h3>'
+    "<p>{text}</p>"
+    '<p><a href="#reply-form" role="button" data-reply-to="{id}">'
+    "Ответить</a></p>"
+    '<ul class="children" id="children{id}">'
+)
+CLOSE = "</ul></div>"
+
+
+def render_thread(comments):
+    """HTML узлов comments, вложенных по parent_id.
+
+    Узел, родителя которого нет среди открытых, становится верхним:
+    так ветку можно рендерить без её вершины и с обрезанным хвостом.
+    """
+    html = []
+    open_ids = []
+    profiles = {}
+    for node in comments:
+        while open_ids and open_ids[-1] != node.parent_id:
+            open_ids.pop()
+            html.append(CLOSE)
+        username = node.author.username
+        if username not in profiles:
+            profiles[username] = reverse("posts:profile", args=(username,))
+        html.append(
+            format_html(
+                NODE,
+                id=node.id,
+                profile=profiles[username],
+                author=username,
+                text=node.text,
+            )
+        )
+        open_ids.append(node.id)
+    html.append(CLOSE * len(open_ids))
+    return mark_safe("".join(html))
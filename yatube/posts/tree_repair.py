@@ -0,0 +1,256 @@
+"""Проверка и починка деревьев комментариев по одному tree_id.
+
+Поля MPTT (tree_id, lft, rght, level) и путь пересчитываются в памяти
+по ссылкам parent, в базу пишутся только разошедшиеся строки. Каждое
+дерево чинится в своей транзакции, поэтому блокируется только оно, а не
+вся таблица, как при Comment.objects.rebuild().
+"""
+import json
+import os
+import time
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Max
+
+from .caching import bump_comments_version
+from .comment_tree import dirty_trees, unmark_dirty
+from .models import Comment, path_step
+
+BATCH_SIZE = 1000
+TREE_FIELDS = ["tree_id", "lft", "rght", "level", "path"]
+METRICS = (
+    "trees_checked",
+    "trees_corrupted",
+    "nodes_fixed",
+    "orphans",
+    "strays",
+    "unreachable",
+)
+
+
+def layout(comments):
+    """Ожидаемые поля дерева для комментариев одного tree_id.
+
+    Возвращает (поля по id, новые корни, чужие ветки, недостижимые id).
+    Главный корень - корень с наименьшим lft; остальные корни (ответы
+    удалённого комментария) получат собственные деревья. Ветка, чей
+    родитель лежит в другом дереве, переносится к родителю.
+    """
+    by_id = {comment.pk: comment for comment in comments}
+    children = defaultdict(list)
+    roots, strays = [], []
+    for comment in sorted(comments, key=lambda c: (c.lft, c.pk)):
+        if comment.parent_id is None:
+            roots.append(comment)
+        elif comment.parent_id in by_id:
+            children[comment.parent_id].append(comment)
+        else:
+            strays.append(comment)
+    fields = {}
+    for root in roots[:1]:
+        walk(root, children, fields, 0, "")
+    reached = set(fields)
+    for top in roots[1:] + strays:
+        reached.update(subtree_ids(top, children))
+    unreachable = [pk for pk in by_id if pk not in reached]
+    return fields, roots[1:], strays, unreachable
+
+
+def walk(root, children, fields, level, prefix):
+    """Обход в глубину без рекурсии: ветки бывают глубже предела стека."""
+    counter = 1
+    stack = [(root, level, prefix, False)]
+    while stack:
+        comment, level, prefix, done = stack.pop()
+        if done:
+            fields[comment.pk]["rght"] = counter
+            counter += 1
+            continue
+        path = prefix + path_step(comment.pk)
+        fields[comment.pk] = {
+            "tree_id": root.tree_id, "lft": counter, "level": level,
+            "path": path,
+        }
+        counter += 1
+        stack.append((comment, level, prefix, True))
+        for child in reversed(children[comment.pk]):
+            stack.append((child, level + 1, path, False))
+
+
+def subtree_ids(top, children):
+    ids, stack = [], [top]
+    while stack:
+        comment = stack.pop()
+        ids.append(comment.pk)
+        stack.extend(children[comment.pk])
+    return ids
+
+
+def tree_violations(comments):
+    """Нарушения инвариантов nested set по видам.
+
+    gaps - границы lft/rght дерева не образуют ряд 1..2n; level -
+    уровень не на единицу больше родительского; containment - узел не
+    лежит внутри границ родителя или в другом дереве.
+    """
+    by_id = {comment.pk: comment for comment in comments}
+    bounds = defaultdict(list)
+    violations = Counter()
+    for comment in comments:
+        bounds[comment.tree_id] += [comment.lft, comment.rght]
+        parent = by_id.get(comment.parent_id)
+        if comment.parent_id is None:
+            violations["level"] += comment.level != 0
+        elif parent is not None:
+            violations["level"] += comment.level != parent.level + 1
+            violations["containment"] += not (
+                parent.tree_id == comment.tree_id
+                and parent.lft < comment.lft < comment.rght < parent.rght
+            )
+    for values in bounds.values():
+        violations["gaps"] += sorted(values) != list(
+            range(1, len(values) + 1)
+        )
+    return violations
+
+
+def repair_tree(tree_id, metrics, fix=True):
+    """Проверяет дерево tree_id и, если fix, чинит его.
+
+    Возвращает tree_id деревьев, которые нужно проверить заново: туда
+    перенесены чужие ветки.
+    """
+    with transaction.atomic():
+        comments = list(
+            Comment.objects.filter(tree_id=tree_id)
+            .select_for_update()
+            .only("parent", "post", *TREE_FIELDS)
+        )
+        fields, orphans, strays, unreachable = layout(comments)
+        stale = [
+            comment for comment in comments
+            if comment.pk in fields and any(
+                getattr(comment, name) != value
+                for name, value in fields[comment.pk].items()
+            )
+        ]
+        metrics["trees_checked"] += 1
+        metrics["orphans"] += len(orphans)
+        metrics["strays"] += len(strays)
+        metrics["unreachable"] += len(unreachable)
+        if not (stale or orphans or strays or unreachable):
+            return set()
+        metrics["trees_corrupted"] += 1
+        metrics["nodes_fixed"] += len(stale)
+        if not fix:
+            return set()
+        for comment in stale:
+            for name, value in fields[comment.pk].items():
+                setattr(comment, name, value)
+        Comment.objects.bulk_update(stale, TREE_FIELDS, BATCH_SIZE)
+        pending = move_branches(comments, orphans, strays)
+    for post_id in {comment.post_id for comment in comments}:
+        bump_comments_version(post_id)
+    return pending
+
+
+def move_branches(comments, orphans, strays):
+    """Переносит лишние корни в новые деревья, чужие ветки - к родителю."""
+    children = defaultdict(list)
+    for comment in comments:
+        children[comment.parent_id].append(comment)
+    pending = set()
+    next_tree = (Comment.objects.aggregate(m=Max("tree_id"))["m"] or 0) + 1
+    for orphan in orphans:
+        Comment.objects.filter(pk__in=subtree_ids(orphan, children)).update(
+            tree_id=next_tree
+        )
+        pending.add(next_tree)
+        next_tree += 1
+    for stray in strays:
+        tree_id = Comment.objects.filter(pk=stray.parent_id).values_list(
+            "tree_id", flat=True
+        ).first()
+        Comment.objects.filter(pk__in=subtree_ids(stray, children)).update(
+            tree_id=tree_id
+        )
+        pending.add(tree_id)
+    return pending
+
+
+class Checkpoint:
+    """Состояние прохода в JSON-файле: последний tree_id, очередь
+    деревьев на перепроверку и накопленные метрики."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tree_id = 0
+        self.pending = []
+        self.metrics = dict.fromkeys(METRICS, 0)
+        self.passes = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as state:
+                self.__dict__.update(json.load(state))
+
+    def save(self):
+        state = {
+            "tree_id": self.tree_id,
+            "pending": sorted(self.pending),
+            "metrics": self.metrics,
+            "passes": self.passes,
+        }
+        with open(self.path + ".tmp", "w", encoding="utf-8") as out:
+            json.dump(state, out)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def take(checkpoint, fix):
+    """Следующее дерево очереди; при починке с него снимается отметка."""
+    tree_id = checkpoint.pending.pop()
+    if fix:
+        unmark_dirty(tree_id)
+    return tree_id
+
+
+def check_trees(checkpoint, budget=None, chunk=BATCH_SIZE, fix=True):
+    """Проверяет деревья после checkpoint.tree_id, пока не выйдет budget
+    секунд. Возвращает метрики этого запуска."""
+    started = time.monotonic()
+    metrics = dict.fromkeys(METRICS, 0)
+
+    def out_of_time():
+        return budget is not None and time.monotonic() - started >= budget
+
+    def drain():
+        # деревья, куда перенесены ветки, проверяются до следующего
+        while checkpoint.pending and not out_of_time():
+            pending = repair_tree(take(checkpoint, fix), metrics, fix)
+            checkpoint.pending = list(set(checkpoint.pending) | pending)
+
+    if fix:
+        # деревья, куда вставлял ответы бэкенд path, чинятся первыми
+        checkpoint.pending = list(set(checkpoint.pending) | dirty_trees())
+    drain()
+    while not out_of_time():
+        tree_ids = list(
+            Comment.objects.filter(tree_id__gt=checkpoint.tree_id)
+            .order_by("tree_id")
+            .values_list("tree_id", flat=True)
+            .distinct()[:chunk]
+        )
+        if not tree_ids:
+            checkpoint.tree_id = 0
+            checkpoint.passes += 1
+            break
+        for tree_id in tree_ids:
+            checkpoint.pending = list(
+                set(checkpoint.pending) | repair_tree(tree_id, metrics, fix)
+            )
+            checkpoint.tree_id = tree_id
+            drain()
+            if out_of_time():
+                break
+    for name, value in metrics.items():
+        checkpoint.metrics[name] += value
+    return metrics
@@ -9,6 +9,29 @@ urlpatterns = [
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
     path("profile/<str:username>/", views.profile, name="profile"),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
+    path(
+        "posts/<int:post_id>/comments/",
+        views.comment_roots,
+        name="comment_roots",
+    ),
+    path(
+        "posts/<int:post_id>/comments/<int:comment_id>/children/",
+        views.comment_children,
+        name="comment_children",
+    ),
+    path(
+        "posts/<int:post_id>/comments/<int:comment_id>/thread/",
+        views.comment_thread,
+        name="comment_thread",
+    ),
+    path(
+        "posts/<int:post_id>/comments/export/",
+        views.comment_export,
+        name="comment_export",
+    ),
+    path(
+        "comments/cache/", views.comment_cache, name="comment_cache"
+    ),
     path("create/", views.post_create, name="post_create"),
     path("posts/<int:post_id>/edit/", views.post_edit, name="post_edit"),
     path(
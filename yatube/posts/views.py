@@ -1,62 +1,209 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import (
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import get_template, render_to_string
+from django.urls import reverse
+from django.utils.http import urlencode
 
+from core.query_budget import query_budget
+
+from .caching import (
+    anonymous_page,
+    cached_comments,
+    cached_feed,
+    cached_post,
+    comment_cache_stats,
+    comments_version,
+    feed_generation,
+    feed_scopes,
+)
+from .comment_tree import ROOT_ORDERS, get_tree
+from .counting import FeedPaginator, post_count
+from .export import export_comments
 from .forms import CommentForm, PostForm
+from .keyset import cursor_before, keyset_page, keyset_window
 from .models import Comment, Follow, Group, Post, User
+from .timeline import TIMELINE_ORDER, MergedFeed, timeline_posts
+from .tree_html import render_thread
 
 POST_NUMBER = 10
 NUMB = 30
+COMMENT_NUMBER = 20
+# ветка не больше стольких ответов разворачивается целиком (comment_thread)
+THREAD_LIMIT = 500
+POST_ORDER = ("-pub_date", "-id")
+# миниатюра поста при холодном кэше - запрос к kvstore sorl-thumbnail;
+# первое создание миниатюры в бюджет не входит
+THUMBNAIL_QUERIES = 1
+
+
+def index_version():
+    return [feed_generation("all")]
+
+
+def group_version(slug):
+    group_id = (
+        Group.objects.filter(slug=slug)
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if group_id is None:
+        return None
+    return [feed_generation(f"group:{group_id}")]
+
 
+def profile_version(username):
+    author_id = (
+        User.objects.filter(username=username)
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if author_id is None:
+        return None
+    return [feed_generation(f"author:{author_id}")]
 
+
+def post_state(post_id):
+    """Автор и группа поста; комментарии не читаются."""
+    return (
+        Post.objects.filter(id=post_id)
+        .order_by()
+        .values_list("author_id", "group_id")
+        .first()
+    )
+
+
+def post_generations(author_id, group_id):
+    return [
+        feed_generation(scope) for scope in feed_scopes(author_id, group_id)
+    ]
+
+
+def post_version(post_id):
+    """Версия поста, постов его автора и дерева его комментариев."""
+    post = post_state(post_id)
+    if post is None:
+        return None
+    return [comments_version(post_id)] + post_generations(*post)
+
+
+@query_budget(6 + POST_NUMBER * THUMBNAIL_QUERIES)
+@anonymous_page(index_version)
 def index(request):
-    posts = Post.objects.all().select_related("author")
+    posts = Post.objects.all().select_related("author", "group")
+    page_obj = paginator(request, posts, "all")
     context = {
-        "page_obj": paginator(request, posts),
+        "page_obj": page_obj,
+        "posts_html": feed_html(request, "index", "all", page_obj),
     }
     return render(request, "posts/index.html", context)
 
 
+@query_budget(7 + POST_NUMBER * THUMBNAIL_QUERIES)
+@anonymous_page(group_version)
 def group_posts(request, slug):
 
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.all().select_related("author")
+    scope = f"group:{group.pk}"
+    page_obj = paginator(request, posts, scope)
     context = {
         "group": group,
-        "page_obj": paginator(request, posts),
+        "page_obj": page_obj,
+        "posts_html": feed_html(
+            request, "group", scope, page_obj, show_group=False
+        ),
     }
     return render(request, "posts/group_list.html", context)
 
 
+@query_budget(8 + POST_NUMBER * THUMBNAIL_QUERIES)
+@anonymous_page(profile_version)
 def profile(request, username):
     following = False
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
+    posts = author.posts.all().select_related("author", "group")
     if request.user.is_authenticated:
         user = request.user
         if Follow.objects.filter(user=user, author=author).exists():
             following = True
+    scope = f"author:{author.pk}"
+    page_obj = paginator(request, posts, scope)
     context = {
-        "page_obj": paginator(request, posts),
+        "page_obj": page_obj,
+        "posts_html": feed_html(request, "profile", scope, page_obj),
         "author": author,
-        "count": posts.count(),
+        "count": post_count(scope, posts),
         "following": following,
     }
     return render(request, "posts/profile.html", context)
 
 
+@query_budget(8 + THUMBNAIL_QUERIES)
+@anonymous_page(post_version)
 def post_detail(request, post_id):
-    post = Post.objects.filter(id=post_id).first()
-    context = {
-        "post": post,
-        "count": post.author.posts.all().count(),
-        "first_ch": post.text[0:NUMB],
-        "comments": post.comments.all(),
-        "form": CommentForm(),
-    }
+    post = post_state(post_id)
+    if post is None:
+        raise Http404
+    author_id, group_id = post
+    context = post_context(
+        request, Post(id=post_id, author_id=author_id, group_id=group_id)
+    )
     return render(request, "posts/post_detail.html", context)
 
 
+# переход к ответу (?comment=) ищет ещё и корень его ветки
+@query_budget(5)
+def comment_roots(request, post_id):
+    post = get_object_or_404(Post, id=post_id)
+    tree = get_tree()
+    order, cursor, params = root_order(request, post, tree)
+    return comment_page(
+        request, post.id, "roots", tree.roots(post), order, cursor, params
+    )
+
+
+@query_budget(4)
+def comment_children(request, post_id, comment_id):
+    comment = get_object_or_404(Comment, id=comment_id, post_id=post_id)
+    tree = get_tree()
+    return comment_page(
+        request,
+        post_id,
+        f"children:{comment_id}",
+        tree.children(comment),
+        tree.order,
+        request.GET.get("cursor") or "",
+        {},
+    )
+
+
+@query_budget(4)
+def comment_thread(request, post_id, comment_id):
+    """Все ответы на комментарий одним фрагментом (render_thread)."""
+    comment = get_object_or_404(Comment, id=comment_id, post_id=post_id)
+    tree = get_tree()
+
+    def render_branch():
+        # post_id ведёт обход MPTT по индексу (post, tree_id, lft)
+        comments = tree.descendants(comment).filter(post_id=post_id)
+        return render_thread(
+            comments.select_related("author")[:THREAD_LIMIT]
+        )
+
+    return HttpResponse(
+        cached_comments(post_id, f"thread:{comment_id}", render_branch)
+    )
+
+
+@query_budget(12)
 @login_required
 def post_create(request):
     if request.method == "POST":
@@ -73,6 +220,7 @@ def post_create(request):
     return render(request, "posts/create_post.html", {"form": form})
 
 
+@query_budget(10)
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -97,31 +245,37 @@ def post_edit(request, post_id):
     return render(request, "posts/create_post.html", context)
 
 
+@query_budget(15)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
-    try:
-        parent_id = request.POST["comment_id"]
-    except:
-        parent_id = 0
+    parent_id = request.POST.get("comment_id")
+    parent = None
+    if parent_id:
+        # ответ - только на комментарий этого же поста
+        if not parent_id.isdigit():
+            raise Http404
+        parent = get_object_or_404(Comment, id=parent_id, post=post)
 
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        if parent_id != 0:
-            comment.parent = Comment.objects.get(id=parent_id)
-        comment.save()
+        comment.parent = parent
+        get_tree().insert(comment)
         return redirect("posts:post_detail", post_id=post_id)
 
-    return render(request, "posts/post_detail.html")
+    return render(
+        request, "posts/post_detail.html", post_context(request, post, form)
+    )
 
 
+@query_budget(20)
 @login_required
 def add_comment_child(request, post_id, id):
     post = get_object_or_404(Post, id=post_id)
-    parent = get_object_or_404(Comment, id=id)
+    parent = get_object_or_404(Comment, id=id, post=post)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         print(parent)
@@ -129,28 +283,28 @@ def add_comment_child(request, post_id, id):
         comment.author = request.user
         comment.post = post
         comment.parent = parent
-        comment.save()
+        get_tree().insert(comment)
         return redirect("posts:post_detail", post_id=post_id)
 
-    context = {
-        "post": post,
-        "form": form,
-        "comments": post.comments.all(),
-        "parent": parent,
-    }
+    context = post_context(request, post, form)
+    context["parent"] = parent
     return render(request, "posts/post_detail.html", context)
 
 
+@query_budget(7 + POST_NUMBER * THUMBNAIL_QUERIES)
 @login_required
 def follow_index(request):
     user = request.user
-    posts = Post.objects.filter(author__following__user=user)
+    posts = timeline_posts(user).select_related("author", "group")
+    # у MergedFeed число постов складывается из кэшей его частей
+    scope = None if isinstance(posts, MergedFeed) else f"follow:{user.pk}"
     context = {
-        "page_obj": paginator(request, posts),
+        "page_obj": paginator(request, posts, scope, TIMELINE_ORDER),
     }
     return render(request, "posts/follow.html", context)
 
 
+@query_budget(20)
 @login_required
 def profile_follow(request, username):
     user = request.user
@@ -164,6 +318,7 @@ def profile_follow(request, username):
     return redirect("posts:profile", username=username)
 
 
+@query_budget(20)
 @login_required
 def profile_unfollow(request, username):
     user = request.user
@@ -172,8 +327,179 @@ def profile_unfollow(request, username):
     return redirect("posts:follow_index")
 
 
-def paginator(request, posts):
-    paginator = Paginator(posts, POST_NUMBER)
+def paginator(request, posts, scope, order=POST_ORDER):
+    """Страница ленты: по номеру (?page=) или по курсору (?cursor=).
+
+    Курсорный режим включает параметр cursor (пустой - первая страница)
+    или настройка POST_PAGINATION = "keyset". Число постов для номеров
+    страниц берётся из кэша области scope (см. counting).
+    """
+    cursor = request.GET.get("cursor")
+    if cursor is not None or settings.POST_PAGINATION == "keyset":
+        return keyset_window(posts, order, cursor, POST_NUMBER)
+    paginator = FeedPaginator(posts.order_by(*order), POST_NUMBER, scope)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
+    page_obj.elided_range = paginator.elided_page_range(page_obj.number)
     return page_obj
+
+
+def feed_html(request, view, scope, page_obj, show_group=True):
+    """HTML постов страницы ленты из кэша по номеру страницы или курсору.
+
+    Каждый пост - отдельная строка списка, шаблон страницы обходит их
+    циклом.
+    """
+    template = get_template("includes/feed_post.html")
+    if getattr(page_obj, "keyset", False):
+        part = f"cursor:{request.GET.get('cursor') or ''}"
+    else:
+        part = f"page:{page_obj.number}"
+    return cached_feed(
+        view,
+        scope,
+        part,
+        lambda: [
+            template.render({"post": post, "show_group": show_group})
+            for post in page_obj
+        ],
+    )
+
+
+def post_context(request, post, form=None):
+    """Контекст страницы поста: общая для всех часть берётся из кэша.
+
+    Пост, сведения об авторе и первая страница комментариев одинаковы
+    для всех читателей; каждому запросу дорисовываются только кнопка
+    правки и формы комментариев с его CSRF-токеном. Достаточно post с
+    id, author_id и group_id.
+    """
+    shared = cached_post(
+        post.id,
+        post_generations(post.author_id, post.group_id),
+        lambda: render_post(post.id),
+    )
+    context = {
+        "post_id": post.id,
+        "author_id": post.author_id,
+        "first_ch": shared["title"],
+        "post_html": shared["html"],
+        "form": form or CommentForm(),
+    }
+    context.update(first_comments(request, post))
+    return context
+
+
+def render_post(post_id):
+    post = Post.objects.select_related("author", "group").get(id=post_id)
+    count = post_count(f"author:{post.author_id}", post.author.posts.all())
+    return {
+        "title": post.text[0:NUMB],
+        "html": render_to_string(
+            "includes/post_body.html", {"post": post, "count": count}
+        ),
+    }
+
+
+def first_comments(request, post):
+    """Первая страница корневых веток для страницы поста."""
+    tree = get_tree()
+    order, cursor, params = root_order(request, post, tree)
+    return {
+        "comments_html": comments_html(
+            post.id,
+            "roots",
+            tree.roots(post),
+            order,
+            cursor,
+            params,
+            reverse("posts:comment_roots", args=(post.id,)),
+        ),
+        "sort": params.get("sort"),
+    }
+
+
+def root_order(request, post, tree):
+    """Порядок корней (?sort=) и курсор, учитывая переход к ?comment=."""
+    sort = request.GET.get("sort")
+    params = {"sort": sort} if sort in ROOT_ORDERS else {}
+    order = ROOT_ORDERS.get(sort, tree.order)
+    cursor = request.GET.get("cursor") or ""
+    comment_id = request.GET.get("comment", "")
+    if comment_id.isdigit():
+        comment = Comment.objects.filter(post=post, id=comment_id).first()
+        if comment is not None:
+            root = comment
+            if comment.parent_id is not None:
+                root_id = comment.ancestor_ids()[0]
+                root = tree.roots(post).filter(id=root_id).first() or comment
+            cursor = cursor_before(tree.roots(post), order, root) or ""
+    return order, cursor, params
+
+
+def comment_page(request, post_id, part, comments, order, cursor, params):
+    """Страница комментариев HTML-фрагментом или JSON (?format=json)."""
+    if request.GET.get("format") == "json":
+        comments, next_cursor = keyset_page(
+            comments.select_related("author"), order, cursor, COMMENT_NUMBER
+        )
+        return JsonResponse(
+            {
+                "comments": [comment_json(node) for node in comments],
+                "next_cursor": next_cursor,
+            }
+        )
+    return HttpResponse(
+        comments_html(
+            post_id, part, comments, order, cursor, params, request.path
+        )
+    )
+
+
+def comments_html(post_id, part, comments, order, cursor, params, url):
+    def render_page():
+        page, next_cursor = keyset_page(
+            comments.select_related("author"), order, cursor, COMMENT_NUMBER
+        )
+        context = {
+            "comments": page,
+            "next_url": None,
+            "thread_limit": THREAD_LIMIT,
+        }
+        if next_cursor:
+            query = urlencode({**params, "cursor": next_cursor})
+            context["next_url"] = f"{url}?{query}"
+        return render_to_string("includes/comment_list.html", context)
+
+    return cached_comments(
+        post_id, f"{part}:{urlencode(params)}:{cursor}", render_page
+    )
+
+
+@query_budget(5)
+@staff_member_required
+def comment_export(request, post_id):
+    post = get_object_or_404(Post, id=post_id)
+    since_id = request.GET.get("since_id", "")
+    since_id = int(since_id) if since_id.isdigit() else None
+    return StreamingHttpResponse(
+        export_comments(post.id, since_id),
+        content_type="application/x-ndjson",
+    )
+
+
+@query_budget(4)
+@staff_member_required
+def comment_cache(request):
+    return JsonResponse(comment_cache_stats())
+
+
+def comment_json(comment):
+    return {
+        "id": comment.id,
+        "parent_id": comment.parent_id,
+        "level": comment.level,
+        "author": comment.author.username,
+        "text": comment.text,
+        "created": comment.created.isoformat(),
+    }
@@ -46,7 +46,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "users.apps.UsersConfig",
-    "core",
+    "core.apps.CoreConfig",
     "about",
     "sorl.thumbnail",
     "debug_toolbar",
@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.metrics.RequestMetricsMiddleware",
+    "core.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -62,6 +64,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "core.query_budget.QueryBudgetMiddleware",
 ]
 
 ROOT_URLCONF = "yatube.urls"
@@ -153,12 +156,68 @@ MEDIA_URL = "/media/"
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# кэш процесса: версии и поколения кэша не видны другим воркерам, и
+# время жизни записей не больше LOCAL_CACHE_TIMEOUT (posts.checks);
+# с общим кэшем (Redis, Memcached) его можно поднять до суток
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
+LOCAL_CACHE_TIMEOUT = 20
 
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
+
+# "mptt" или "path" (материализованный путь, вставка за O(1))
+COMMENT_TREE_BACKEND = "mptt"
+
+# "pages" - ленты по номеру страницы, "keyset" - по курсору (pub_date, id)
+POST_PAGINATION = "pages"
+
+# число постов лент сбрасывается сигналами, время - страховка и предел
+# устаревания в остальных воркерах при кэше процесса; оценка по
+# статистике таблицы вместо COUNT для всей ленты
+POST_COUNT_TIMEOUT = LOCAL_CACHE_TIMEOUT
+POST_COUNT_ESTIMATE = False
+
+# с этого числа подписчиков посты автора не раскладываются по лентам
+# подписок, а читаются при показе (posts.timeline)
+FEED_PULL_THRESHOLD = 1000
+
+# фрагменты дерева комментариев сбрасываются по версии, время - страховка
+# и предел устаревания в остальных воркерах при кэше процесса
+COMMENT_CACHE_TIMEOUT = LOCAL_CACHE_TIMEOUT
+
+# страницы лент сбрасываются по поколению области, время - страховка
+# и предел устаревания в остальных воркерах при кэше процесса
+FEED_CACHE_TIMEOUT = LOCAL_CACHE_TIMEOUT
+
+# страницы анонимов целиком; ключ по версиям данных, время - для того,
+# что версии не отслеживают (названия групп, имена авторов), и предел
+# устаревания в остальных воркерах при кэше процесса
+PAGE_CACHE_TIMEOUT = LOCAL_CACHE_TIMEOUT
+
+# превышение бюджета запросов представления (core.query_budget): False -
+# предупреждение в лог, True - исключение (так его проверяют тесты)
+QUERY_BUDGET_RAISE = False
+
+# адреса, с которых Prometheus читает /metrics (core.metrics)
+METRICS_IPS = [
+    "127.0.0.1",
+]
+
+# выборочное профилирование (core.profiling): доля всех запросов, имена
+# URL, которые профилируются всегда, и заголовок, включающий профиль
+# для запросов с INTERNAL_IPS ("HTTP_X_PROFILE"); всё пусто - выключено
+PROFILE_SAMPLE_RATE = 0
+PROFILE_VIEWS = []
+PROFILE_HEADER = ""
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+PROFILE_KEEP = 200
+
+# журнал SQL-запросов не быстрее SLOW_QUERY_MS (core.slow_queries);
+# None - не писать, например 100 - включить
+SLOW_QUERY_MS = None
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, "slow_queries.jsonl")
@@ -18,6 +18,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path, re_path
 
+from core.views import metrics
+
 
 handler404 = "core.views.page_not_found"
 handler500 = "core.views.server_error"
@@ -29,6 +31,7 @@ urlpatterns = [
     path("auth/", include("users.urls", namespace="users")),
     path("auth/", include("django.contrib.auth.urls")),
     path("about/", include("about.urls", namespace="about")),
+    path("metrics", metrics, name="metrics"),
 ]
 
 if settings.DEBUG: